@@ -1,14 +1,39 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template, redirect, url_for, session
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template, redirect, url_for, session, stream_with_context
 import os
+import glob
+import json
+import hmac
+import time
 import jwt
-import requests
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
 import logging
 from functools import wraps
-from sync_databases import User, Dog, db, sync_databases
+from sync_databases import User, Dog, db, sync_databases, ensure_indexes, refresh_rows, replica_synced, SQLITE_URL
+from catalog import (is_catalog_query, parse_catalog_params, filter_dogs, fetch_dog_page, serialize_dog,
+                     ListingCache, FacetCounts, CATALOG_FILTERS, FACET_COLUMNS)
+from user_cache import UserCache
+from password_hashing import PasswordHasher, HashingUnavailable
+from chat_client import ChatClient, ChatServiceError
+from chat_cache import ChatResponseCache, normalize_message
+from chat_limiter import ConcurrencyLimiter, RequestCoalescer, UpstreamBusy
+from rate_limit import RateLimiter
+from static_assets import StaticAssets
+from bootstrap import Bootstrap, default_boot_id
+from dog_events import DogChangeHub
+from change_feed import ChangeFeed
+from db_routing import ReplicaRouter
+from sqlite_profile import sqlite_engine_options, apply_sqlite_profile
+from metrics import RequestMetrics
+from query_profiler import QueryProfiler
+from recommender import DogRecommender, TRAIT_NAMES
+from dog_io import iter_ndjson_rows, iter_csv_rows, export_ndjson, export_csv
+from dog_search import install_search_index, search_dogs, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from user_listing import is_user_listing_query, parse_user_params, build_user_query, stream_users, USER_COLUMNS
+from sqlalchemy import select, insert, update, delete, inspect
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,14 +49,226 @@ if os.getenv("DATABASE_URL"):
 else:
     # Ensure instance directory exists
     os.makedirs('instance', exist_ok=True)
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///instance/adoptease.db"
+    app.config["SQLALCHEMY_DATABASE_URI"] = SQLITE_URL
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options()
 
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["RATE_LIMIT"] = "100 per day"  # Basic rate limiting
+app.config["REPLICA_READS"] = os.getenv("REPLICA_READS", "1") != "0"  # With DATABASE_URL, serve read-only handlers from the SQLite replica
+app.config["REPLICA_MAX_STALENESS"] = float(os.getenv("REPLICA_MAX_STALENESS", 120))  # Seconds since the last sync before reads use Postgres
+app.config["REPLICA_STICKY_SECONDS"] = float(os.getenv("REPLICA_STICKY_SECONDS", 5))  # Reads stay on Postgres this long after a client writes
+app.config["RATE_LIMIT"] = os.getenv("RATE_LIMIT", "100 per day")  # Default limit, e.g. for /chat
+app.config["AUTH_RATE_LIMIT"] = os.getenv("AUTH_RATE_LIMIT", "10 per minute; 100 per day")  # Login and registration, per email
+app.config["AUTH_IP_RATE_LIMIT"] = os.getenv("AUTH_IP_RATE_LIMIT", "30 per minute; 300 per day")  # Login and registration, per IP whatever the email
+app.config["RATE_LIMIT_MAX_BUCKETS"] = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100000))  # Least recently used buckets are dropped beyond this
+app.config["PROXY_FIX_HOPS"] = int(os.getenv("PROXY_FIX_HOPS", 1 if os.getenv("RENDER") else 0))  # Trusted proxies setting X-Forwarded-For; Render has one
+app.config["STATIC_ASSET_CACHE"] = os.getenv("STATIC_ASSET_CACHE", "1") != "0"  # Disable while editing pages
+app.config["BOOTSTRAP_BACKGROUND"] = os.getenv("BOOTSTRAP_BACKGROUND", "1") != "0"  # 0 runs startup work before serving
+app.config["BOOTSTRAP_REQUEST_TIMEOUT"] = float(os.getenv("BOOTSTRAP_REQUEST_TIMEOUT", 10))  # How long data requests wait for startup
+app.config["DOG_IMPORT_BATCH_SIZE"] = int(os.getenv("DOG_IMPORT_BATCH_SIZE", 1000))  # Rows per import transaction
+app.config["DOG_IMPORT_MAX_ERRORS"] = int(os.getenv("DOG_IMPORT_MAX_ERRORS", 1000))  # Row errors listed in the import report
+app.config["DOG_EXPORT_BATCH_SIZE"] = int(os.getenv("DOG_EXPORT_BATCH_SIZE", 1000))  # Rows fetched per cursor round trip
+app.config["SQL_PROFILE"] = os.getenv("SQL_PROFILE", "0") != "0"  # 1 records every query; for development and staging
+app.config["SQL_SLOW_QUERY_MS"] = float(os.getenv("SQL_SLOW_QUERY_MS", 100))
+app.config["SQL_N_PLUS_ONE_THRESHOLD"] = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5))  # Repeats of one statement per request
+app.config["SQL_PROFILE_HISTORY"] = int(os.getenv("SQL_PROFILE_HISTORY", 50))  # Request reports kept for the debug endpoint
+app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")  # Bearer token required by /metrics, if set
+app.config["LISTING_CACHE_MAX_AGE"] = float(os.getenv("LISTING_CACHE_MAX_AGE", 30))  # Seconds a cached listing may miss other processes' writes
+app.config["FACET_MAX_AGE"] = int(os.getenv("FACET_MAX_AGE", 300))  # Seconds before facet counts are rebuilt
+app.config["RECOMMEND_MAX_AGE"] = int(os.getenv("RECOMMEND_MAX_AGE", 300))  # Seconds before the feature matrix is rebuilt
+app.config["USER_LIST_BATCH_SIZE"] = int(os.getenv("USER_LIST_BATCH_SIZE", 1000))  # Rows fetched per cursor round trip
+app.config["CHANGE_FEED_SIZE"] = int(os.getenv("CHANGE_FEED_SIZE", 1000))  # Dog changes kept for clients resuming a stream
+app.config["CHANGE_FEED_HEARTBEAT"] = float(os.getenv("CHANGE_FEED_HEARTBEAT", 15))  # Seconds between keepalives on an idle poll
+app.config["CHANGE_FEED_MAX_SECONDS"] = float(os.getenv("CHANGE_FEED_MAX_SECONDS", 25))  # Idle polls end after this and clients poll again
+app.config["CHANGE_FEED_MAX_STREAMS"] = int(os.getenv("CHANGE_FEED_MAX_STREAMS", 8))  # Polls held open at once, each on a request thread
+app.config["CHANGE_FEED_RESYNC"] = int(os.getenv("CHANGE_FEED_RESYNC", 60))  # Seconds between list reloads for writes on other workers, 0 for never
+app.config["DOG_BATCH_MAX_IDS"] = int(os.getenv("DOG_BATCH_MAX_IDS", 10000))  # Ids accepted by one batch update/delete
+app.config["AUTH_CACHE_TTL"] = int(os.getenv("AUTH_CACHE_TTL", 60))  # Seconds a resolved user is reused
+app.config["AUTH_CACHE_SIZE"] = int(os.getenv("AUTH_CACHE_SIZE", 1024))
+app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")  # Werkzeug method string, e.g. pbkdf2:sha256:600000
+app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", 2))  # 0 hashes inline
+app.config["PASSWORD_HASH_QUEUE_SIZE"] = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 32))
+app.config["PASSWORD_HASH_TIMEOUT"] = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+app.config["OPENROUTER_BASE_URL"] = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")  # Point at a local stub for testing
+app.config["CHAT_MODEL"] = os.getenv("CHAT_MODEL", "openai/gpt-3.5-turbo")
+app.config["CHAT_POOL_SIZE"] = int(os.getenv("CHAT_POOL_SIZE", 10))
+app.config["CHAT_CONNECT_TIMEOUT"] = float(os.getenv("CHAT_CONNECT_TIMEOUT", 3.05))
+app.config["CHAT_READ_TIMEOUT"] = float(os.getenv("CHAT_READ_TIMEOUT", 60))
+app.config["CHAT_RETRIES"] = int(os.getenv("CHAT_RETRIES", 2))
+app.config["CHAT_CACHE_MAX_BYTES"] = int(os.getenv("CHAT_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+app.config["CHAT_CACHE_TTL"] = int(os.getenv("CHAT_CACHE_TTL", 3600))
+app.config["CHAT_CACHE_SIMILARITY"] = float(os.getenv("CHAT_CACHE_SIMILARITY", 0))  # Jaccard threshold, 0 matches exact questions only
+app.config["CHAT_MAX_CONCURRENT"] = int(os.getenv("CHAT_MAX_CONCURRENT", 8))  # Upstream calls in flight across all users
+app.config["CHAT_MAX_PER_USER"] = int(os.getenv("CHAT_MAX_PER_USER", 2))
+app.config["CHAT_MAX_QUEUE"] = int(os.getenv("CHAT_MAX_QUEUE", 16))  # Requests allowed to wait for a free slot
+app.config["CHAT_QUEUE_TIMEOUT"] = float(os.getenv("CHAT_QUEUE_TIMEOUT", 10))
+
+# Behind a reverse proxy, take the client address from the hops it appended so rate limits are per client
+if app.config["PROXY_FIX_HOPS"]:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_HOPS"], x_proto=app.config["PROXY_FIX_HOPS"])
 
 # Initialize Flask-SQLAlchemy
 db.init_app(app)
 
+# WAL, busy timeout and cache pragmas when the app itself runs on SQLite
+with app.app_context():
+    apply_sqlite_profile(db.engine)
+
+# Reads that tolerate a little lag go to the SQLite replica; writes always go to Postgres
+if os.getenv("DATABASE_URL") and app.config["REPLICA_READS"]:
+    replica_router = ReplicaRouter(
+        SQLITE_URL,
+        max_staleness=app.config["REPLICA_MAX_STALENESS"],
+        sticky_seconds=app.config["REPLICA_STICKY_SECONDS"],
+        catch_up=lambda: sync_replica()
+    )
+    replica_router.init_app(app)
+else:
+    replica_router = None
+
+def replica_reads(f):
+    """Serve a read-only handler, token lookup included, from the replica when it is fresh enough"""
+    return replica_router.read_only(f) if replica_router is not None else f
+
+def refresh_replica(model, ids):
+    """Copy rows just written to Postgres into the replica"""
+    if replica_router is None:
+        return
+    try:
+        refresh_rows(db.engine, replica_router.replica_engine, model, ids)
+    except Exception as e:
+        # The next incremental sync repairs it; until then stickiness covers the writer
+        logger.error(f"Replica refresh of {model.__tablename__} failed: {str(e)}")
+
+# Per-route latency, status, in-flight and DB time, scraped from /metrics
+request_metrics = RequestMetrics()
+request_metrics.init_app(app)
+
+# Opt-in SQL profiling: slow-query log, N+1 warnings and per-request reports
+if app.config["SQL_PROFILE"]:
+    query_profiler = QueryProfiler(
+        slow_query_ms=app.config["SQL_SLOW_QUERY_MS"],
+        n_plus_one=app.config["SQL_N_PLUS_ONE_THRESHOLD"],
+        history=app.config["SQL_PROFILE_HISTORY"],
+    )
+    query_profiler.init_app(app)
+else:
+    query_profiler = None
+
+# Committed dog writes are published here for the caches and indexes below
+dog_changes = DogChangeHub()
+
+@dog_changes.subscribe
+def refresh_replica_dogs(kind, ids, fields):
+    """DogChangeHub listener, subscribed first so the replica is current before caches re-read it"""
+    if replica_router is None:
+        return
+    if kind == 'reload' or ids is None:
+        sync_replica()
+    else:
+        refresh_replica(Dog, ids)
+
+# Encoded dog listings, invalidated whenever a dog is added, changed or removed here and expired for writes elsewhere
+listing_cache = ListingCache(max_age=app.config["LISTING_CACHE_MAX_AGE"])
+dog_changes.subscribe(listing_cache.on_dog_change)
+
+# Recent dog changes streamed to open catalog pages so they can patch their lists
+change_feed = ChangeFeed(
+    app.config["CHANGE_FEED_SIZE"],
+    dumps=app.json.dumps,
+    max_streams=app.config["CHANGE_FEED_MAX_STREAMS"],
+    resync=app.config["CHANGE_FEED_RESYNC"]
+)
+dog_changes.subscribe(change_feed.on_dog_change)
+
+def in_app_context(f):
+    """Run f in its own app context, so caches can reload from a background thread"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        with app.app_context():
+            return f(*args, **kwargs)
+    return decorated
+
+@in_app_context
+def load_facet_rows():
+    return db.session.execute(select(Dog.id, *[getattr(Dog, column) for column in FACET_COLUMNS])).all()
+
+# Filter dropdown counts, adjusted per write instead of recomputed per request
+facet_counts = FacetCounts(load_facet_rows, max_age=app.config["FACET_MAX_AGE"])
+dog_changes.subscribe(facet_counts.on_dog_change)
+
+@in_app_context
+def load_recommender_rows(ids):
+    """Fetch the columns the recommender encodes, for all dogs or the given ids"""
+    columns = select(Dog.id, Dog.age, Dog.height, Dog.weight, Dog.breed, Dog.color, Dog.gender, Dog.personality)
+    if ids is None:
+        return db.session.execute(columns).all()
+    rows = []
+    for start in range(0, len(ids), 500):
+        rows += db.session.execute(columns.where(Dog.id.in_(ids[start:start + 500]))).all()
+    return rows
+
+# Feature matrix of the catalog for preference matching; needs NumPy
+try:
+    dog_recommender = DogRecommender(load_recommender_rows, max_age=app.config["RECOMMEND_MAX_AGE"])
+    dog_changes.subscribe(dog_recommender.on_dog_change)
+except RuntimeError as e:
+    logger.warning(f"Recommendations disabled: {str(e)}")
+    dog_recommender = None
+
+# Static files compressed and fingerprinted once at startup
+static_assets = StaticAssets(app.static_folder).build() if app.config["STATIC_ASSET_CACHE"] else None
+
+# Token-bucket rate limiting per route and per user or client IP
+rate_limiter = RateLimiter(app.config["RATE_LIMIT"], max_buckets=app.config["RATE_LIMIT_MAX_BUCKETS"])
+
+def submitted_email():
+    """Email in the JSON body of a login or registration, rate limited on its own besides the client IP"""
+    data = request.get_json(silent=True)
+    email = data.get("email") if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) else ""
+
+# Users resolved by token_required, so authenticated requests skip the user lookup
+user_cache = UserCache(max_entries=app.config["AUTH_CACHE_SIZE"], ttl=app.config["AUTH_CACHE_TTL"])
+
+# CPU-heavy password hashing runs on its own process pool, away from request threads
+password_hasher = PasswordHasher(
+    method=app.config["PASSWORD_HASH_METHOD"],
+    workers=app.config["PASSWORD_HASH_WORKERS"],
+    queue_size=app.config["PASSWORD_HASH_QUEUE_SIZE"],
+    timeout=app.config["PASSWORD_HASH_TIMEOUT"]
+)
+
+# Shared keep-alive connection pool to the AI chat service
+chat_client = ChatClient(
+    base_url=app.config["OPENROUTER_BASE_URL"],
+    api_key=os.getenv("OPENROUTER_API_KEY"),
+    model=app.config["CHAT_MODEL"],
+    pool_size=app.config["CHAT_POOL_SIZE"],
+    connect_timeout=app.config["CHAT_CONNECT_TIMEOUT"],
+    read_timeout=app.config["CHAT_READ_TIMEOUT"],
+    retries=app.config["CHAT_RETRIES"]
+)
+
+# Answers to repeated questions, so common FAQs skip the upstream call
+chat_cache = ChatResponseCache(
+    max_bytes=app.config["CHAT_CACHE_MAX_BYTES"],
+    ttl=app.config["CHAT_CACHE_TTL"],
+    similarity=app.config["CHAT_CACHE_SIMILARITY"]
+)
+
+# Backpressure for upstream AI calls, so slow answers cannot starve the other endpoints
+chat_limiter = ConcurrencyLimiter(
+    max_concurrent=app.config["CHAT_MAX_CONCURRENT"],
+    per_user=app.config["CHAT_MAX_PER_USER"],
+    max_queue=app.config["CHAT_MAX_QUEUE"],
+    queue_timeout=app.config["CHAT_QUEUE_TIMEOUT"]
+)
+chat_coalescer = RequestCoalescer()
+
+CHAT_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+CHAT_SYSTEM_PROMPT = "You are a helpful assistant for a pet adoption platform. Provide accurate and helpful information about pet care, adoption processes, and general pet-related queries."
+
 # Print environment variables for debugging
 logger.info("Environment variables loaded:")
 logger.info(f"SECRET_KEY: {'Set' if os.getenv('SECRET_KEY') else 'Not set'}")
@@ -44,7 +281,7 @@ def create_admin():
         logger.info("Admin already exists")
         return
     
-    hashed_password = generate_password_hash(os.getenv('ADMIN_PASSWORD'))
+    hashed_password = generate_password_hash(os.getenv('ADMIN_PASSWORD'), app.config["PASSWORD_HASH_METHOD"])
     admin = User(
             email=os.getenv('ADMIN_EMAIL'),
             password=hashed_password,
@@ -57,28 +294,73 @@ def create_admin():
     db.session.commit()
     logger.info("Admin user created successfully")
 
-# Create tables and sync databases
-with app.app_context():
-    try:
-        # Create tables if they don't exist
-        db.create_all()
-        logger.info("Database tables created/verified")
+def admin_exists():
+    return User.query.filter_by(type="admin", email=os.getenv('ADMIN_EMAIL')).first() is not None
 
-        # Create admin user if not exists
-        create_admin()
-        
-        # Sync databases
-        sync_databases()
-        logger.info("Database synchronization completed")
-        
-        # Verify data
-        user_count = User.query.count()
-        dog_count = Dog.query.count()
-        logger.info(f"Database contains {user_count} users and {dog_count} dogs")
-        
-    except Exception as e:
-        logger.error(f"Error during database initialization: {str(e)}")
-        raise
+def tables_exist():
+    return all(inspect(db.engine).has_table(model.__tablename__) for model in (User, Dog))
+
+def create_tables():
+    # Create tables if they don't exist
+    db.create_all()
+    ensure_indexes(db.engine)
+    install_search_index(db.engine)
+    logger.info("Database tables created/verified")
+
+def sync_replica():
+    # Pull only what changed since the last sync; falls back to a full copy on a fresh replica
+    sync_databases(incremental=True)
+    logger.info("Database synchronization completed")
+
+def verify_data():
+    user_count = User.query.count()
+    dog_count = Dog.query.count()
+    logger.info(f"Database contains {user_count} users and {dog_count} dogs")
+
+# One-time startup work, run in the background so workers can serve static files immediately
+os.makedirs('instance', exist_ok=True)
+bootstrap = Bootstrap(
+    app,
+    # (name, step, check that its result is still in place when another worker already ran it)
+    steps=[
+        ("create_tables", create_tables, tables_exist),
+        ("create_admin", create_admin, admin_exists),
+        ("sync_databases", sync_replica, replica_synced),
+        ("verify_data", verify_data, None),
+    ],
+    lock_path=os.path.join('instance', 'bootstrap.lock'),
+    # Workers forked from the same master share a boot id and bootstrap only once;
+    # set BOOT_ID per deploy to make that explicit
+    boot_id=os.getenv("BOOT_ID") or default_boot_id(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py')))
+)
+
+# Endpoints that do not need the database and are served while bootstrap runs
+BOOTSTRAP_EXEMPT_ENDPOINTS = {"index", "serve_static", "static", "healthz", "readyz", "metrics"}
+
+@app.before_request
+def wait_for_bootstrap():
+    if request.endpoint in BOOTSTRAP_EXEMPT_ENDPOINTS:
+        return None
+    if not bootstrap.wait(app.config["BOOTSTRAP_REQUEST_TIMEOUT"]):
+        return jsonify({"message": "Service is starting up", "bootstrap": bootstrap.status()}), 503, {"Retry-After": "5"}
+    return None
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok", "bootstrap": bootstrap.state})
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    status = bootstrap.status()
+    return jsonify(status), 200 if bootstrap.ready else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint; requires METRICS_TOKEN as a bearer token when set"""
+    expected = app.config["METRICS_TOKEN"]
+    if expected and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {expected}"):
+        return jsonify({"message": "Unauthorized"}), 401
+    return Response(request_metrics.render(), mimetype="text/plain; version=0.0.4")
 
 # Error handling middleware
 @app.errorhandler(Exception)
@@ -86,6 +368,18 @@ def handle_error(error):
     logger.error(f"Error occurred: {str(error)}")
     return jsonify({"message": "An internal server error occurred"}), 500
 
+def find_user(email):
+    """Look a user up on the replica when allowed, falling back to Postgres on a miss"""
+    if replica_router is None:
+        return User.query.filter_by(email=email).first()
+    with replica_router.reads() as on_replica:
+        db_user = User.query.filter_by(email=email).first()
+    if db_user is None and on_replica:
+        # Accounts created since the last refresh may not have reached the replica yet
+        with replica_router.primary():
+            db_user = User.query.filter_by(email=email).first()
+    return db_user
+
 # Authentication decorator
 def token_required(f):
     @wraps(f)
@@ -97,9 +391,12 @@ def token_required(f):
         token = auth_header.split(" ")[1]
         try:
             payload = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
-            user = User.query.filter_by(email=payload["email"]).first()
-            if not user:
-                return jsonify({"message": "User no longer exists"}), 401
+            user = user_cache.get(payload["email"])
+            if user is None:
+                db_user = find_user(payload["email"])
+                if not db_user:
+                    return jsonify({"message": "User no longer exists"}), 401
+                user = user_cache.put(db_user)
             return f(user, *args, **kwargs)
         except jwt.ExpiredSignatureError:
             return jsonify({"message": "Token expired"}), 401
@@ -117,22 +414,43 @@ def admin_required(f):
     return decorated
 
 # Input validation functions
+# Per-field rules shared by full (validate_dog_data) and partial (validate_dog_changes) validation
+DOG_FIELD_RULES = {
+    'name': (lambda v: isinstance(v, str) and len(v) >= 2, "Name must be at least 2 characters long"),
+    'breed': (lambda v: isinstance(v, str) and len(v) >= 2, "Breed must be at least 2 characters long"),
+    'age': (lambda v: v and isinstance(v, int) and 0 <= v <= 30, "Age must be a positive number between 0 and 30"),
+    'color': (lambda v: isinstance(v, str) and len(v) >= 2, "Color must be at least 2 characters long"),
+    'height': (lambda v: v and isinstance(v, (int, float)) and 0 < v <= 200, "Height must be a positive number between 0 and 200 cm"),
+    'weight': (lambda v: v and isinstance(v, (int, float)) and 0 < v <= 100, "Weight must be a positive number between 0 and 100 kg"),
+    'gender': (lambda v: v in ['Male', 'Female'], "Gender must be either Male or Female"),
+}
+
+# Optional free-text fields; when given they must be strings
+DOG_TEXT_FIELDS = ['vaccines', 'diseases', 'medical_history', 'personality']
+
+# Columns each role may change
+ADMIN_DOG_FIELDS = ['name', 'breed', 'age', 'color', 'height', 'weight', 'gender',
+                    'vaccines', 'diseases', 'medical_history', 'personality']
+EXPERT_DOG_FIELDS = ['name', 'breed', 'age', 'color', 'height', 'weight', 'vaccines', 'diseases']
+
 def validate_dog_data(data):
     errors = []
-    if not data.get('name') or len(data['name']) < 2:
-        errors.append("Name must be at least 2 characters long")
-    if not data.get('breed') or len(data['breed']) < 2:
-        errors.append("Breed must be at least 2 characters long")
-    if not data.get('age') or not isinstance(data['age'], int) or data['age'] < 0 or data['age'] > 30:
-        errors.append("Age must be a positive number between 0 and 30")
-    if not data.get('color') or len(data['color']) < 2:
-        errors.append("Color must be at least 2 characters long")
-    if not data.get('height') or not isinstance(data['height'], (int, float)) or data['height'] <= 0 or data['height'] > 200:
-        errors.append("Height must be a positive number between 0 and 200 cm")
-    if not data.get('weight') or not isinstance(data['weight'], (int, float)) or data['weight'] <= 0 or data['weight'] > 100:
-        errors.append("Weight must be a positive number between 0 and 100 kg")
-    if not data.get('gender') or data['gender'] not in ['Male', 'Female']:
-        errors.append("Gender must be either Male or Female")
+    for field, (check, message) in DOG_FIELD_RULES.items():
+        if not check(data.get(field)):
+            errors.append(message)
+    for field in DOG_TEXT_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            errors.append(f"{field} must be text")
+    return errors
+
+def validate_dog_changes(changes, allowed_fields):
+    """Validate only the fields present in a partial update"""
+    errors = [f"Field cannot be changed: {field}" for field in changes if field not in allowed_fields]
+    for field, value in changes.items():
+        if field in DOG_FIELD_RULES and not DOG_FIELD_RULES[field][0](value):
+            errors.append(DOG_FIELD_RULES[field][1])
+        elif field in DOG_TEXT_FIELDS and value is not None and not isinstance(value, str):
+            errors.append(f"{field} must be text")
     return errors
 
 def validate_user_data(data):
@@ -147,15 +465,53 @@ def validate_user_data(data):
         errors.append("Invalid user type")
     return errors
 
+def build_dog_listing():
+    """Build the dog list payload shared by the admin, expert and customer endpoints
+
+    Without query parameters the whole catalog is returned as before. Passing any
+    of breed, color, gender, min_age/max_age, min_weight/max_weight, sort, limit
+    or cursor returns a single keyset-paginated page plus a next_cursor.
+    """
+    if not is_catalog_query(request.args):
+        return {"dogs": [serialize_dog(dog) for dog in Dog.query.all()]}
+
+    params = parse_catalog_params(request.args)
+    dogs, next_cursor = fetch_dog_page(Dog.query, params)
+    return {
+        "dogs": [serialize_dog(dog) for dog in dogs],
+        "next_cursor": next_cursor,
+        "limit": params["limit"],
+    }
+
+def dog_listing_response():
+    """Serve a dog listing from the cache, answering If-None-Match with 304"""
+    key = tuple(sorted(request.args.items(multi=True)))
+    cached = listing_cache.get(key)
+    if cached is None:
+        version = listing_cache.version
+        body = (app.json.dumps(build_dog_listing()) + "\n").encode()
+        cached = listing_cache.put(key, body, version)
+
+    etag, body = cached
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
 @app.route("/")
 def index():
-    return send_from_directory(".", "index.html")
+    return serve_static("index.html")
 
 @app.route("/<path:path>")
 def serve_static(path):
+    if static_assets is not None:
+        response = static_assets.response_for(path, request, app.response_class)
+        if response is not None:
+            return response
     return send_from_directory(".", path)
 
 @app.route("/api/login", methods=["POST"])
+@rate_limiter.limit(app.config["AUTH_IP_RATE_LIMIT"], key=submitted_email, key_spec=app.config["AUTH_RATE_LIMIT"])
 def login():
     try:
         data = request.get_json()
@@ -170,9 +526,20 @@ def login():
         if not user:
             return jsonify({"message": "User not found"}), 401
 
-        if not check_password_hash(user.password, password):
+        if not password_hasher.verify(user.password, password):
             return jsonify({"message": "Incorrect password"}), 401
 
+        # Upgrade hashes made with older cost settings while we know the password;
+        # when the hashing pool is busy this waits for a later login
+        try:
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+                logger.info(f"Rehashed password for {email}")
+        except HashingUnavailable as e:
+            db.session.rollback()
+            logger.warning(f"Skipped password rehash for {email}: {str(e)}")
+
         expiration = datetime.utcnow() + timedelta(
             days=30 if remember_me else 1
         )
@@ -189,11 +556,16 @@ def login():
             "name": user.name,
             "type": user.type,
         })
+    except HashingUnavailable as e:
+        db.session.rollback()
+        logger.warning(f"Login rejected: {str(e)}")
+        return jsonify({"message": "Server is busy, please try again"}), 503, {"Retry-After": "1"}
     except Exception as e:
         logger.error(f"Login error: {str(e)}")
         return jsonify({"message": "An error occurred during login"}), 500
 
 @app.route("/api/register", methods=["POST"])
+@rate_limiter.limit(app.config["AUTH_IP_RATE_LIMIT"], key=submitted_email, key_spec=app.config["AUTH_RATE_LIMIT"])
 def register():
     try:
         data = request.get_json()
@@ -208,7 +580,7 @@ def register():
         if existing_user:
             return jsonify({"message": "User already exists"}), 409
 
-        hashed_password = generate_password_hash(data['password'])
+        hashed_password = password_hasher.hash(data['password'])
         new_user = User(
             email=data['email'],
             password=hashed_password,
@@ -219,6 +591,7 @@ def register():
 
         db.session.add(new_user)
         db.session.commit()
+        refresh_replica(User, [new_user.id])
         logger.info(f"New user registered: {data['email']}")
 
         expiration = datetime.utcnow() + timedelta(days=1)
@@ -229,12 +602,17 @@ def register():
         )
 
         return jsonify({"message": "Registration successful", "type": data['type'],"token":token})
+    except HashingUnavailable as e:
+        db.session.rollback()
+        logger.warning(f"Registration rejected: {str(e)}")
+        return jsonify({"message": "Server is busy, please try again"}), 503, {"Retry-After": "1"}
     except Exception as e:
         db.session.rollback()
         logger.error(f"Registration error: {str(e)}")
         return jsonify({"message": "An error occurred during registration"}), 500
 
 @app.route("/api/verify-token", methods=["GET"])
+@replica_reads
 @token_required
 def verify_token(user):
     return jsonify({
@@ -246,48 +624,31 @@ def verify_token(user):
 @token_required
 @admin_required
 def get_all_users(user):
+    """Stream users as JSON; q, type, sort, limit or cursor return one keyset page"""
     try:
-        users = User.query.all()
-        user_list = [
-            {
-                "id": u.id,
-                "email": u.email,
-                "name": u.name,
-                "type": u.type,
-                "created_at": u.created_at,
-            }
-            for u in users
-        ]
-        return jsonify({"users": user_list})
-    except Exception as e:
-        logger.error(f"Error fetching users: {str(e)}")
-        return jsonify({"message": "An error occurred while fetching users"}), 500
+        params = parse_user_params(request.args) if is_user_listing_query(request.args) else None
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    def rows():
+        if params is None:
+            query = select(*USER_COLUMNS).order_by(User.id)
+        else:
+            query = build_user_query(params)
+        query = query.execution_options(yield_per=app.config["USER_LIST_BATCH_SIZE"])
+        for row in db.session.execute(query):
+            yield row
+
+    return Response(stream_with_context(stream_users(rows(), params)), mimetype="application/json")
 
 @app.route("/api/admin/dogs", methods=["GET"])
 @token_required
 @admin_required
 def get_admin_dogs(user):
     try:
-        dogs = Dog.query.all()
-        dog_list = [
-            {
-                "id": dog.id,
-                "name": dog.name,
-                "breed": dog.breed,
-                "gender": dog.gender,
-                "age": dog.age,
-                "color": dog.color,
-                "height": dog.height,
-                "weight": dog.weight,
-                "vaccines": dog.vaccines,
-                "diseases": dog.diseases,
-                "medical_history": dog.medical_history,
-                "personality": dog.personality,
-                "created_at": dog.created_at
-            }
-            for dog in dogs
-        ]
-        return jsonify({"dogs": dog_list})
+        return dog_listing_response()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching dogs: {str(e)}")
         return jsonify({"message": "An error occurred while fetching dogs"}), 500
@@ -298,7 +659,7 @@ def get_admin_dogs(user):
 def add_dog(user):
     try:
         data = request.get_json()
-        if not data:
+        if not isinstance(data, dict) or not data:
             return jsonify({"message": "Invalid request data"}), 400
 
         errors = validate_dog_data(data)
@@ -322,6 +683,7 @@ def add_dog(user):
 
         db.session.add(new_dog)
         db.session.commit()
+        dog_changes.publish('insert', [new_dog.id], serialize_dog(new_dog))
         logger.info(f"New dog added: {data['name']}")
         return jsonify({"message": "Dog added successfully", "id": new_dog.id}), 201
     except Exception as e:
@@ -329,37 +691,133 @@ def add_dog(user):
         logger.error(f"Error adding dog: {str(e)}")
         return jsonify({"message": "An error occurred while adding the dog"}), 500
 
+@app.route("/api/admin/dogs/import", methods=["POST"])
+@token_required
+@admin_required
+def import_dogs(user):
+    """Bulk-insert dogs from a streamed NDJSON or CSV body
+
+    The format comes from ?format=csv|ndjson or the Content-Type. Every row is
+    checked with validate_dog_data; valid rows are inserted in batches of
+    DOG_IMPORT_BATCH_SIZE, one transaction per batch, and invalid rows are
+    listed in the returned report.
+    """
+    imported = 0
+    try:
+        data_format = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+        if data_format not in ("csv", "ndjson"):
+            return jsonify({"message": "Format must be csv or ndjson"}), 400
+        rows = iter_csv_rows(request.stream) if data_format == "csv" else iter_ndjson_rows(request.stream)
+
+        batch_size = app.config["DOG_IMPORT_BATCH_SIZE"]
+        max_errors = app.config["DOG_IMPORT_MAX_ERRORS"]
+        failed = 0
+        errors = []
+        batch = []
+        now = datetime.utcnow()
+
+        def flush(batch):
+            db.session.execute(insert(Dog), batch)
+            db.session.commit()
+            return len(batch)
+
+        for row_number, data, parse_error in rows:
+            try:
+                row_errors = [parse_error] if parse_error else validate_dog_data(data)
+            except Exception as e:
+                # One malformed row must not abort an import whose earlier batches are committed
+                row_errors = [f"Invalid row: {str(e)}"]
+            if row_errors:
+                failed += 1
+                if len(errors) < max_errors:
+                    errors.append({"row": row_number, "errors": row_errors})
+                continue
+
+            batch.append({
+                "name": data['name'],
+                "breed": data['breed'],
+                "age": data['age'],
+                "color": data['color'],
+                "height": data['height'],
+                "weight": data['weight'],
+                "gender": data['gender'],
+                "vaccines": data.get('vaccines', ''),
+                "diseases": data.get('diseases', ''),
+                "medical_history": data.get('medical_history', ''),
+                "personality": data.get('personality', ''),
+                "created_at": now,
+                "updated_at": now,
+            })
+            if len(batch) >= batch_size:
+                imported += flush(batch)
+                batch = []
+        if batch:
+            imported += flush(batch)
+
+        if imported:
+            dog_changes.publish('reload')
+        logger.info(f"Imported {imported} dogs, {failed} rows rejected")
+        return jsonify({
+            "message": "Import finished",
+            "imported": imported,
+            "failed": failed,
+            "errors": errors,
+            "errors_truncated": failed > len(errors),
+        })
+    except Exception as e:
+        db.session.rollback()
+        if imported:
+            dog_changes.publish('reload')
+        logger.error(f"Error importing dogs: {str(e)}")
+        return jsonify({"message": "An error occurred while importing dogs", "imported": imported}), 500
+
+@app.route("/api/admin/dogs/export", methods=["GET"])
+@token_required
+@admin_required
+def export_dogs(user):
+    """Stream every dog as NDJSON (default) or CSV straight off a server-side cursor"""
+    data_format = request.args.get("format", "ndjson")
+    if data_format not in ("csv", "ndjson"):
+        return jsonify({"message": "Format must be csv or ndjson"}), 400
+
+    def rows():
+        query = select(Dog.__table__).order_by(Dog.id).execution_options(yield_per=app.config["DOG_EXPORT_BATCH_SIZE"])
+        for row in db.session.execute(query).mappings():
+            yield row
+
+    if data_format == "csv":
+        body, mimetype = export_csv(rows()), "text/csv"
+    else:
+        body, mimetype = export_ndjson(rows()), "application/x-ndjson"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=dogs.{data_format}"}
+    )
+
 @app.route("/api/admin/dogs/<int:dog_id>", methods=["PUT"])
 @token_required
 @admin_required
 def edit_dog(user, dog_id):
     try:
         data = request.get_json()
-        if not data:
+        if not isinstance(data, dict) or not data:
             return jsonify({"message": "Invalid request data"}), 400
 
         errors = validate_dog_data(data)
         if errors:
             return jsonify({"message": "Validation failed", "errors": errors}), 400
 
-        dog = Dog.query.get(dog_id)
-        if not dog:
+        # Optional text fields keep their current value when omitted
+        changes = {field: data[field] for field in ADMIN_DOG_FIELDS if field in data}
+        updated = db.session.query(Dog).filter(Dog.id == dog_id).update(changes, synchronize_session=False)
+        if not updated:
+            db.session.rollback()
             return jsonify({"message": "Dog not found"}), 404
 
-        dog.name = data['name']
-        dog.breed = data['breed']
-        dog.age = data['age']
-        dog.color = data['color']
-        dog.height = data['height']
-        dog.weight = data['weight']
-        dog.gender = data['gender']
-        dog.vaccines = data.get('vaccines', dog.vaccines)
-        dog.diseases = data.get('diseases', dog.diseases)
-        dog.medical_history = data.get('medical_history', dog.medical_history)
-        dog.personality = data.get('personality', dog.personality)
-
         db.session.commit()
-        logger.info(f"Dog updated: {dog.name}")
+        dog_changes.publish('update', [dog_id], changes)
+        logger.info(f"Dog updated: {data['name']}")
         return jsonify({"message": "Dog updated successfully"})
     except Exception as e:
         db.session.rollback()
@@ -371,114 +829,372 @@ def edit_dog(user, dog_id):
 @admin_required
 def delete_dog(user, dog_id):
     try:
-        dog = Dog.query.get(dog_id)
-        if not dog:
+        deleted = db.session.query(Dog).filter(Dog.id == dog_id).delete(synchronize_session=False)
+        if not deleted:
+            db.session.rollback()
             return jsonify({"message": "Dog not found"}), 404
 
-        db.session.delete(dog)
         db.session.commit()
-        logger.info(f"Dog deleted: {dog.name}")
+        dog_changes.publish('delete', [dog_id])
+        logger.info(f"Dog deleted: {dog_id}")
         return jsonify({"message": "Dog deleted successfully"})
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error deleting dog: {str(e)}")
         return jsonify({"message": "An error occurred while deleting the dog"}), 500
 
+def dog_batch_criteria(data):
+    """WHERE clause for the dogs a batch request targets, by "ids" or by a catalog "filter"
+
+    Filters take the same keys as the listing query parameters. Raises
+    ValueError for a missing, ambiguous or empty selection.
+    """
+    ids = data.get("ids")
+    filters = data.get("filter")
+    if (ids is None) == (filters is None):
+        raise ValueError("Provide either ids or filter")
+
+    if ids is not None:
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            raise ValueError("ids must be a non-empty list of integers")
+        if len(ids) > app.config["DOG_BATCH_MAX_IDS"]:
+            raise ValueError(f"At most {app.config['DOG_BATCH_MAX_IDS']} ids per request")
+        return Dog.id.in_(ids)
+
+    if not isinstance(filters, dict) or not any(filters.get(key) not in (None, '') for key in CATALOG_FILTERS):
+        raise ValueError(f"filter needs at least one of: {', '.join(CATALOG_FILTERS)}")
+    return filter_dogs(db.session.query(Dog), parse_catalog_params(filters)).whereclause
+
+@app.route("/api/admin/dogs", methods=["PATCH"])
+@token_required
+@admin_required
+def batch_update_dogs(user):
+    """Apply the same changes to many dogs with one UPDATE statement"""
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or not isinstance(data.get("changes"), dict) or not data["changes"]:
+            return jsonify({"message": "Invalid request data"}), 400
+
+        errors = validate_dog_changes(data["changes"], ADMIN_DOG_FIELDS)
+        if errors:
+            return jsonify({"message": "Validation failed", "errors": errors}), 400
+
+        statement = update(Dog).where(dog_batch_criteria(data)).values(data["changes"]).returning(Dog.id)
+        ids = db.session.scalars(statement.execution_options(synchronize_session=False)).all()
+        updated = len(ids)
+        db.session.commit()
+        if updated:
+            dog_changes.publish('update', ids, data["changes"])
+        logger.info(f"Batch updated {updated} dogs")
+        return jsonify({"message": "Dogs updated successfully", "updated": updated})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error batch updating dogs: {str(e)}")
+        return jsonify({"message": "An error occurred while updating dogs"}), 500
+
+@app.route("/api/admin/dogs", methods=["DELETE"])
+@token_required
+@admin_required
+def batch_delete_dogs(user):
+    """Remove many dogs with one DELETE statement"""
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or not data:
+            return jsonify({"message": "Invalid request data"}), 400
+
+        statement = delete(Dog).where(dog_batch_criteria(data)).returning(Dog.id)
+        ids = db.session.scalars(statement.execution_options(synchronize_session=False)).all()
+        deleted = len(ids)
+        db.session.commit()
+        if deleted:
+            dog_changes.publish('delete', ids)
+        logger.info(f"Batch deleted {deleted} dogs")
+        return jsonify({"message": "Dogs deleted successfully", "deleted": deleted})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error batch deleting dogs: {str(e)}")
+        return jsonify({"message": "An error occurred while deleting dogs"}), 500
+
+@app.route("/api/admin/dogs/<int:dog_id>", methods=["PATCH"])
+@token_required
+@admin_required
+def patch_dog(user, dog_id):
+    """Change some fields of one dog without reading the row first"""
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or not data:
+            return jsonify({"message": "Invalid request data"}), 400
+
+        errors = validate_dog_changes(data, ADMIN_DOG_FIELDS)
+        if errors:
+            return jsonify({"message": "Validation failed", "errors": errors}), 400
+
+        updated = db.session.query(Dog).filter(Dog.id == dog_id).update(data, synchronize_session=False)
+        if not updated:
+            db.session.rollback()
+            return jsonify({"message": "Dog not found"}), 404
+
+        db.session.commit()
+        dog_changes.publish('update', [dog_id], data)
+        logger.info(f"Dog patched: {dog_id}")
+        return jsonify({"message": "Dog updated successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating dog: {str(e)}")
+        return jsonify({"message": "An error occurred while updating the dog"}), 500
+
 @app.route("/api/expert/dogs", methods=["GET"])
+@replica_reads
 @token_required
 def get_dogs(user):
     try:
-        dogs = Dog.query.all()
-        dog_list = [
-            {
-                "id": dog.id,
-                "name": dog.name,
-                "breed": dog.breed,
-                "gender": dog.gender,
-                "age": dog.age,
-                "color": dog.color,
-                "height": dog.height,
-                "weight": dog.weight,
-                "vaccines": dog.vaccines,
-                "diseases": dog.diseases,
-                "medical_history": dog.medical_history,
-                "personality": dog.personality,
-                "created_at": dog.created_at
-            }
-            for dog in dogs
-        ]
-        return jsonify({"dogs": dog_list})
+        return dog_listing_response()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching dogs: {str(e)}")
         return jsonify({"message": "An error occurred while fetching dogs"}), 500
 
 @app.route("/api/customer/dogs", methods=["GET"])
+@replica_reads
 @token_required
 def get_all_dog(user):
     try:
-        dogs = Dog.query.all()
-        dog_list = [
-            {
-                "id": dog.id,
-                "name": dog.name,
-                "breed": dog.breed,
-                "gender": dog.gender,
-                "age": dog.age,
-                "color": dog.color,
-                "height": dog.height,
-                "weight": dog.weight,
-                "vaccines": dog.vaccines,
-                "diseases": dog.diseases,
-                "medical_history": dog.medical_history,
-                "personality": dog.personality,
-                "created_at": dog.created_at
-            }
-            for dog in dogs
-        ]
-        return jsonify({"dogs": dog_list})
+        return dog_listing_response()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching dogs: {str(e)}")
         return jsonify({"message": "An error occurred while fetching dogs"}), 500
 
+def chat_event_stream(message, first_fragment, fragments, state):
+    """Relay completion fragments to the browser as server-sent events
+
+    The full answer is cached and stored in state once the upstream finishes.
+    """
+    answer = []
+    try:
+        if first_fragment is not None:
+            answer.append(first_fragment)
+            yield f"data: {json.dumps({'delta': first_fragment})}\n\n"
+        for fragment in fragments:
+            answer.append(fragment)
+            yield f"data: {json.dumps({'delta': fragment})}\n\n"
+        state["answer"] = ''.join(answer)
+        chat_cache.put(message, state["answer"])
+        yield "event: done\ndata: {}\n\n"
+    except ChatServiceError as e:
+        logger.error(f"OpenRouter API error: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'message': 'Error communicating with AI service'})}\n\n"
+
+def cached_chat_stream(answer):
+    """Send a finished answer using the same event format as a live stream"""
+    yield f"data: {json.dumps({'delta': answer})}\n\n"
+    yield "event: done\ndata: {}\n\n"
+
+def chat_answer_response(answer, stream, cache_status):
+    """Return an already complete answer as JSON or as a single-event stream"""
+    if stream:
+        return Response(cached_chat_stream(answer), mimetype="text/event-stream",
+                        headers={**CHAT_STREAM_HEADERS, "X-Cache": cache_status})
+    return jsonify({"response": answer}), 200, {"X-Cache": cache_status}
+
+def call_chat_upstream(user, message, stream, key, flight):
+    """Ask the upstream as the leader of an in-flight question
+
+    Holds a limiter slot for the whole upstream call, including the lifetime
+    of a streamed response, and publishes the result to coalesced followers.
+    """
+    try:
+        token = chat_limiter.acquire(user.id)
+    except UpstreamBusy as e:
+        chat_coalescer.finish(key, flight, error=e)
+        raise
+
+    upstream_start = time.perf_counter()
+    messages = [
+        {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+        {"role": "user", "content": message},
+    ]
+    try:
+        if stream:
+            fragments = chat_client.stream(messages)
+            # Wait for the first token so upstream failures still get a proper status code
+            first_fragment = next(fragments, None)
+            state = {}
+
+            def finish_stream():
+                fragments.close()
+                chat_limiter.release(token)
+                request_metrics.observe_upstream("chat", time.perf_counter() - upstream_start,
+                                                 "ok" if "answer" in state else "error")
+                if "answer" in state:
+                    chat_coalescer.finish(key, flight, result=state["answer"])
+                else:
+                    chat_coalescer.finish(key, flight, error=ChatServiceError("Stream did not complete"))
+
+            response = Response(
+                chat_event_stream(message, first_fragment, fragments, state),
+                mimetype="text/event-stream",
+                headers={**CHAT_STREAM_HEADERS, "X-Cache": "MISS"}
+            )
+            response.call_on_close(finish_stream)
+            return response
+
+        answer = chat_client.complete(messages)
+    except Exception as e:
+        chat_limiter.release(token)
+        request_metrics.observe_upstream("chat", time.perf_counter() - upstream_start, "error")
+        chat_coalescer.finish(key, flight, error=e)
+        raise
+
+    chat_limiter.release(token)
+    request_metrics.observe_upstream("chat", time.perf_counter() - upstream_start)
+    chat_cache.put(message, answer)
+    chat_coalescer.finish(key, flight, result=answer)
+    return chat_answer_response(answer, False, "MISS")
+
+@app.route("/api/customer/recommendations", methods=["GET"])
+@token_required
+def recommend_dogs(user):
+    """Rank dogs against preferences given as query parameters
+
+    age, height and weight are targets; breed, color and gender may repeat or
+    be comma-separated; personality is free text such as "calm, good with kids".
+    """
+    if dog_recommender is None:
+        return jsonify({"message": "Recommendations are not available"}), 503
+    try:
+        preferences = {"personality": request.args.get("personality")}
+        for field in ("age", "height", "weight"):
+            value = request.args.get(field)
+            preferences[field] = float(value) if value else None
+        for field in ("breed", "color", "gender"):
+            preferences[field] = [value for arg in request.args.getlist(field) for value in arg.split(",") if value.strip()]
+        limit = min(int(request.args.get("limit") or 10), 50)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"message": "age, height, weight and limit must be numbers"}), 400
+
+    try:
+        matches = dog_recommender.recommend(preferences, limit)
+        dogs = {dog.id: dog for dog in Dog.query.filter(Dog.id.in_([dog_id for dog_id, _ in matches]))} if matches else {}
+        results = [
+            {**serialize_dog(dogs[dog_id]), "score": round(score, 4)}
+            for dog_id, score in matches if dog_id in dogs
+        ]
+        return jsonify({"dogs": results, "traits": list(TRAIT_NAMES)})
+    except Exception as e:
+        logger.error(f"Error recommending dogs: {str(e)}")
+        return jsonify({"message": "An error occurred while recommending dogs"}), 500
+
+@app.route("/api/dogs/facets", methods=["GET"])
+@token_required
+def get_dog_facets(user):
+    """Dog counts per breed, color, gender and age bucket for the filter dropdowns"""
+    try:
+        etag, body = facet_counts.snapshot()
+        response = app.response_class(body, mimetype="application/json")
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response.make_conditional(request)
+    except Exception as e:
+        logger.error(f"Error fetching facets: {str(e)}")
+        return jsonify({"message": "An error occurred while fetching facets"}), 500
+
+@app.route("/api/dogs/changes", methods=["GET"])
+@token_required
+def dog_change_stream(user):
+    """Long-poll dog changes as server-sent events, resuming after ?cursor= or Last-Event-ID"""
+    if not change_feed.open():
+        return jsonify({"message": "Too many open change feeds, please try again"}), 503, {"Retry-After": "5"}
+    cursor = request.args.get("cursor") or request.headers.get("Last-Event-ID")
+    events = change_feed.stream(
+        cursor,
+        heartbeat=app.config["CHANGE_FEED_HEARTBEAT"],
+        max_seconds=app.config["CHANGE_FEED_MAX_SECONDS"]
+    )
+    response = Response(events, mimetype="text/event-stream", headers=CHAT_STREAM_HEADERS)
+    # The slot is held until the poll's body is fully sent or the client goes away
+    response.call_on_close(change_feed.close)
+    return response
+
+@app.route("/api/dogs/search", methods=["GET"])
+@token_required
+def search_dog_catalog(user):
+    """Full-text search over personality, vaccines, diseases and medical history"""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"message": "Search query is required"}), 400
+    try:
+        limit = min(int(request.args.get("limit") or DEFAULT_SEARCH_LIMIT), MAX_SEARCH_LIMIT)
+        offset = int(request.args.get("offset") or 0)
+        if limit < 1 or offset < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({"message": "limit and offset must be non-negative numbers"}), 400
+
+    try:
+        matches = search_dogs(db.session, query, limit, offset)
+        dogs = {dog.id: dog for dog in Dog.query.filter(Dog.id.in_([dog_id for dog_id, _ in matches]))} if matches else {}
+        results = [
+            {**serialize_dog(dogs[dog_id]), "score": round(score, 4)}
+            for dog_id, score in matches if dog_id in dogs
+        ]
+        return jsonify({"dogs": results, "query": query})
+    except Exception as e:
+        logger.error(f"Error searching dogs: {str(e)}")
+        return jsonify({"message": "An error occurred while searching dogs"}), 500
+
 @app.route("/chat", methods=["POST"])
 @token_required
+@rate_limiter.limit()
 def chat(user):
     try:
         data = request.get_json()
-        if not data or "message" not in data:
+        if not isinstance(data, dict) or not isinstance(data.get("message"), str):
             return jsonify({"message": "Invalid request data"}), 400
 
-        api_key = os.getenv("OPENROUTER_API_KEY")
-        if not api_key:
+        if not chat_client.api_key:
             return jsonify({"message": "OpenRouter API key not configured"}), 500
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
-
-        payload = {
-            "model": "openai/gpt-3.5-turbo",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant for a pet adoption platform. Provide accurate and helpful information about pet care, adoption processes, and general pet-related queries.",
-                },
-                {"role": "user", "content": data["message"]},
-            ],
-        }
-
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-        )
+        stream = bool(data.get("stream"))
+        cached_answer = chat_cache.get(data["message"])
+        if cached_answer is not None:
+            return chat_answer_response(cached_answer, stream, "HIT")
 
-        if response.status_code != 200:
-            logger.error(f"OpenRouter API error: {response.text}")
-            return jsonify({"message": "Error communicating with AI service"}), 500
+        # Identical questions already being answered share that upstream call
+        key = normalize_message(data["message"])
+        flight, leader = chat_coalescer.join(key)
+        if leader:
+            return call_chat_upstream(user, data["message"], stream, key, flight)
 
-        return jsonify({"response": response.json()["choices"][0]["message"]["content"]})
+        # Followers hold a thread too, so they count against the queue and the user's limit
+        follower = chat_limiter.acquire_follower(user.id)
+        try:
+            finished = flight.done.wait(app.config["CHAT_QUEUE_TIMEOUT"] + app.config["CHAT_READ_TIMEOUT"])
+        finally:
+            chat_limiter.release_follower(follower)
+        if not finished:
+            raise UpstreamBusy("Chat service is busy", 503, 1)
+        if isinstance(flight.error, UpstreamBusy):
+            raise UpstreamBusy(str(flight.error), 503, flight.error.retry_after)
+        if flight.error is not None:
+            raise ChatServiceError(str(flight.error))
+        return chat_answer_response(flight.result, stream, "COALESCED")
+    except UpstreamBusy as e:
+        logger.warning(f"Chat request rejected: {str(e)}")
+        return jsonify({"message": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
+    except ChatServiceError as e:
+        logger.error(f"OpenRouter API error: {str(e)}")
+        return jsonify({"message": "Error communicating with AI service"}), 500
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
         return jsonify({"message": "An error occurred during chat"}), 500
@@ -488,21 +1204,26 @@ def chat(user):
 def update_dog_expert(user, dog_id):
     try:
         data = request.get_json()
-        if not data:
+        if not isinstance(data, dict) or not data:
             return jsonify({"message": "Invalid request data"}), 400
 
-        dog = Dog.query.get(dog_id)
-        if not dog:
+        changes = {field: data[field] for field in EXPERT_DOG_FIELDS if field in data}
+        errors = validate_dog_changes(changes, EXPERT_DOG_FIELDS)
+        if errors:
+            return jsonify({"message": "Validation failed", "errors": errors}), 400
+
+        if changes:
+            found = db.session.query(Dog).filter(Dog.id == dog_id).update(changes, synchronize_session=False)
+        else:
+            found = db.session.query(Dog.id).filter(Dog.id == dog_id).first() is not None
+        if not found:
+            db.session.rollback()
             return jsonify({"message": "Dog not found"}), 404
 
-        allowed_fields = ['name', 'breed', 'age', 'color', 'height', 'weight', 'vaccines', 'diseases']
-        
-        for field in allowed_fields:
-            if field in data:
-                setattr(dog, field, data[field])
-        
         db.session.commit()
-        logger.info(f"Expert updated dog {dog.name}")
+        if changes:
+            dog_changes.publish('update', [dog_id], changes)
+        logger.info(f"Expert updated dog {dog_id}")
         return jsonify({"message": "Dog information updated successfully"})
     except Exception as e:
         db.session.rollback()
@@ -525,6 +1246,8 @@ def delete_user(user, user_id):
         # Delete the user
         db.session.delete(user_to_delete)
         db.session.commit()
+        refresh_replica(User, [user_id])
+        user_cache.invalidate(user_to_delete.email)
         
         logger.info(f"User deleted: {user_to_delete.email}")
         return jsonify({"message": "User deleted successfully"})
@@ -533,6 +1256,58 @@ def delete_user(user, user_id):
         logger.error(f"Error deleting user: {str(e)}")
         return jsonify({"message": "An error occurred while deleting the user"}), 500
 
+@app.route("/api/admin/auth-cache", methods=["GET"])
+@token_required
+@admin_required
+def get_auth_cache_stats(user):
+    return jsonify(user_cache.stats())
+
+@app.route("/api/admin/chat-cache", methods=["GET"])
+@token_required
+@admin_required
+def get_chat_cache_stats(user):
+    return jsonify(chat_cache.stats())
+
+@app.route("/api/admin/recommender", methods=["GET"])
+@token_required
+@admin_required
+def get_recommender_stats(user):
+    if dog_recommender is None:
+        return jsonify({"message": "Recommendations are not available"}), 503
+    return jsonify(dog_recommender.stats())
+
+@app.route("/api/admin/replica", methods=["GET"])
+@token_required
+@admin_required
+def get_replica_stats(user):
+    if replica_router is None:
+        return jsonify({"message": "Replica reads are disabled"}), 404
+    return jsonify(replica_router.stats())
+
+@app.route("/api/admin/query-profile", methods=["GET"])
+@token_required
+@admin_required
+def get_query_profile(user):
+    """Recent per-request query reports; ?id= selects the one named in X-Query-Report"""
+    if query_profiler is None:
+        return jsonify({"message": "SQL profiling is disabled; set SQL_PROFILE=1"}), 404
+    report_id = request.args.get("id", type=int)
+    return jsonify({"reports": query_profiler.recent(report_id)})
+
+@app.route("/api/admin/change-feed", methods=["GET"])
+@token_required
+@admin_required
+def get_change_feed_stats(user):
+    return jsonify(change_feed.stats())
+
+@app.route("/api/admin/chat-limiter", methods=["GET"])
+@token_required
+@admin_required
+def get_chat_limiter_stats(user):
+    return jsonify({**chat_limiter.stats(), "coalesced": chat_coalescer.coalesced})
+
+bootstrap.start(background=app.config["BOOTSTRAP_BACKGROUND"])
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
 
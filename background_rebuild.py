@@ -0,0 +1,77 @@
+"""Rebuilds of in-memory dog indexes off the request path
+
+FacetCounts and DogRecommender both derive an index from the dog table, keep
+it current from DogChangeHub events and rebuild it from scratch once it is
+stale. BackgroundRebuild is the part they share: the first build runs in the
+caller, later ones in a daemon thread while the old index keeps serving, and
+the changes seen during the load are replayed onto the new index before it
+is swapped in.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRebuild:
+    """Schedules rebuilds of one index and swaps the results in
+
+    `build()` returns a new index loaded from the database. `apply(index, kind,
+    ids, fields)` applies one change to an index and returns False when only a
+    rebuild can account for it. `swap(index)` installs a new index in the
+    owner. Except for build(), all of them run with the owner's `lock` held, and
+    the owner must hold it when calling refresh() and record().
+    """
+
+    def __init__(self, name, lock, build, apply, swap, max_age=300):
+        self.name = name
+        self.lock = lock
+        self.build = build
+        self.apply = apply
+        self.swap = swap
+        self.max_age = max_age
+        self.built_at = None
+        self.rebuilds = 0
+        self.expired = False  # Set when a change could not be applied; the index needs a rebuild
+        self._replay = None  # Changes seen while a background rebuild runs, else None
+
+    @property
+    def running(self):
+        return self._replay is not None
+
+    def refresh(self, force=False):
+        """Build now if nothing is built yet, else start a rebuild when stale or forced"""
+        if self.built_at is None:
+            self._install(self.build(), [])
+        elif (force or self.expired or time.monotonic() - self.built_at > self.max_age) and not self.running:
+            self._replay = []
+            threading.Thread(target=self._run, name=f"{self.name}-rebuild", daemon=True).start()
+
+    def record(self, kind, ids, fields):
+        """Keep a change for replay onto the index being rebuilt"""
+        if self._replay is not None:
+            self._replay.append((kind, ids, fields))
+
+    def _install(self, index, replay):
+        # Changes that landed during the load may or may not be in it; applying them again is harmless
+        self.expired = not all(self.apply(index, *change) for change in replay)
+        self.swap(index)
+        self.built_at = time.monotonic()
+        self.rebuilds += 1
+
+    def _run(self):
+        try:
+            index = self.build()
+        except Exception as e:
+            logger.error(f"Rebuild of {self.name} failed: {str(e)}")
+            with self.lock:
+                # Keep serving the old index and try again after max_age
+                self._replay = None
+                self.expired = False
+                self.built_at = time.monotonic()
+            return
+
+        with self.lock:
+            replay, self._replay = self._replay, None
+            self._install(index, replay)
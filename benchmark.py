@@ -0,0 +1,418 @@
+"""Reproducible HTTP benchmark suite for the AdoptEase API
+
+Seeds a throwaway SQLite database, imports app.py against it (with the chat
+API pointed at chat_stub) and drives the main scenarios: login bursts, catalog
+browsing, search, facets, admin edits and chat. Requests go through the Flask
+test client, or with --server through a real threaded WSGI server over HTTP.
+Throughput and p50/p99 latency are reported per scenario and dataset size, and
+can be saved as a baseline that later runs are compared against.
+
+    python benchmark.py --dogs 1000 100000 --requests 300 --concurrency 8
+    python benchmark.py --server --save-baseline bench-baseline.json
+    python benchmark.py --baseline bench-baseline.json --tolerance 0.15
+    python benchmark.py --sync-contention 5 --dogs 100000
+
+--sync-contention skips the HTTP scenarios and instead measures reads on a
+SQLite replica while one sync transaction writes to it, with stock settings
+and with sqlite_profile.
+
+Datasets grow in place, so sizes are seeded in ascending order and each size
+only inserts the rows it adds. The same --seed always yields the same data.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+from chat_stub import make_handler  # noqa: E402
+
+BENCH_PASSWORD = "benchpass123"
+ADMIN_EMAIL = "admin@bench.local"
+
+BREEDS = ['Labrador Retriever', 'German Shepherd', 'Golden Retriever', 'Beagle', 'Bulldog', 'Poodle', 'Pug', 'Great Dane']
+SEARCH_TERMS = ['kids', 'playful', 'rabies', 'loyal', 'trained', 'parvo']
+CHAT_WORDS = ['feeding', 'puppy', 'vaccines', 'walks', 'grooming', 'training', 'adoption', 'senior', 'crate', 'treats']
+
+SCENARIOS = ('login', 'catalog_page', 'catalog_full', 'search', 'facets', 'admin_edit', 'chat')
+
+
+def prepare_environment(workdir, stub_url):
+    """Point app.py at a scratch database and the local chat stub before it is imported"""
+    os.makedirs(os.path.join(workdir, 'instance'), exist_ok=True)
+    os.chdir(workdir)
+    os.environ.update({
+        # Empty rather than unset so a DATABASE_URL in .env cannot point the run at Postgres
+        "DATABASE_URL": "",
+        "SQLITE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "ADMIN_EMAIL": ADMIN_EMAIL,
+        "ADMIN_PASSWORD": BENCH_PASSWORD,
+        "ADMIN_NAME": "Bench Admin",
+        "OPENROUTER_BASE_URL": stub_url,
+        "OPENROUTER_API_KEY": "bench",
+        "RATE_LIMIT": "1000000 per second",
+        "AUTH_RATE_LIMIT": "1000000 per second",
+        "BOOTSTRAP_BACKGROUND": "0",
+    })
+
+
+def seed_dogs(appmod, target, seed, batch_size=10000):
+    """Grow the dog table to target rows; returns the number inserted"""
+    from sqlalchemy import func, select
+    from generate_data import DOG_COLUMNS, bulk_insert, generate_dogs
+    db, Dog = appmod.db, appmod.Dog
+    with appmod.app.app_context():
+        existing = db.session.scalar(select(func.count()).select_from(Dog))
+        missing = target - existing
+        if missing <= 0:
+            return 0
+        bulk_insert(db.engine, Dog.__table__, DOG_COLUMNS, generate_dogs(seed, missing, existing, batch_size))
+    appmod.dog_changes.publish('reload')
+    return missing
+
+
+def seed_users(appmod, count):
+    """Create count customers sharing one password hash; returns their emails"""
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy import insert
+    from datetime import datetime
+    emails = [f"customer{i}@bench.local" for i in range(count)]
+    with appmod.app.app_context():
+        known = {email for (email,) in appmod.db.session.query(appmod.User.email).filter(appmod.User.email.in_(emails))}
+        password = generate_password_hash(BENCH_PASSWORD, appmod.app.config["PASSWORD_HASH_METHOD"])
+        rows = [{"email": email, "name": f"Customer {i}", "password": password, "type": "customer",
+                 "created_at": datetime.utcnow()} for i, email in enumerate(emails) if email not in known]
+        if rows:
+            appmod.db.session.execute(insert(appmod.User), rows)
+            appmod.db.session.commit()
+    return emails
+
+
+class TestClientTransport:
+    """Calls the app in-process through one Flask test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, json=body)
+        data = response.get_data()
+        response.close()
+        return response.status_code, data
+
+
+class HttpTransport:
+    """Calls a real server over HTTP with one keep-alive session per thread"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None, body=None):
+        import requests
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.request(method, self.base_url + path, headers=headers, json=body)
+        return response.status_code, response.content
+
+
+def start_server(app):
+    """Serve the app on a free port with a threaded WSGI server"""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def login(transport, email):
+    status, body = transport.request('POST', '/api/login', body={"email": email, "password": BENCH_PASSWORD})
+    if status != 200:
+        raise RuntimeError(f"Login failed for {email}: {status} {body[:200]!r}")
+    return {"Authorization": f"Bearer {json.loads(body)['token']}"}
+
+
+def scenario_request(name, rng, context, worker):
+    """Return (method, path, headers, body) for one request of a scenario"""
+    customer = context["customer_headers"][worker % len(context["customer_headers"])]
+    if name == 'login':
+        return 'POST', '/api/login', None, {"email": rng.choice(context["emails"]), "password": BENCH_PASSWORD}
+    if name == 'catalog_page':
+        query = f"sort={rng.choice(['id_asc', 'age_desc', 'weight_asc', 'name_asc'])}&limit=50"
+        if rng.random() < 0.5:
+            query += f"&breed={rng.choice(BREEDS).replace(' ', '%20')}"
+        return 'GET', f"/api/customer/dogs?{query}", customer, None
+    if name == 'catalog_full':
+        return 'GET', '/api/customer/dogs', customer, None
+    if name == 'search':
+        return 'GET', f"/api/dogs/search?q={rng.choice(SEARCH_TERMS)}", customer, None
+    if name == 'facets':
+        return 'GET', '/api/dogs/facets', customer, None
+    if name == 'admin_edit':
+        dog_id = rng.randint(1, context["dogs"])
+        return 'PATCH', f"/api/admin/dogs/{dog_id}", context["admin_headers"], {"age": rng.randint(1, 16)}
+    if name == 'chat':
+        message = ' '.join(rng.sample(CHAT_WORDS, 4)) + f" {rng.randrange(10 ** 6)}"
+        return 'POST', '/chat', customer, {"message": message}
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(transport, name, context, requests, concurrency, seed):
+    """Issue requests calls of a scenario from concurrency threads and summarize them"""
+    counter = itertools.count()
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+
+    def worker(index):
+        # Seeded per dataset size too, so chat questions are not cache hits from the previous size
+        rng = random.Random(f"{seed}-{name}-{context['dogs']}-{index}")
+        while next(counter) < requests:
+            method, path, headers, body = scenario_request(name, rng, context, index)
+            start = time.perf_counter()
+            status, _ = transport.request(method, path, headers, body)
+            latencies[index].append(time.perf_counter() - start)
+            if status >= 400:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    values = sorted(latency for worker_latencies in latencies for latency in worker_latencies)
+    return {
+        "requests": len(values),
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "errors": sum(errors),
+    }
+
+
+def run_sync_contention(workdir, dogs, seconds, readers, seed):
+    """Time reads against a SQLite file while a long sync transaction upserts into it
+
+    Runs once with SQLAlchemy's stock SQLite settings and once with
+    sqlite_profile, each on a fresh file, and returns stats per profile.
+    """
+    from datetime import datetime
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.exc import OperationalError
+    from generate_data import DOG_COLUMNS, bulk_insert, generate_dogs
+    from sqlite_profile import create_sqlite_engine
+    from sync_databases import Dog, upsert_rows, SYNC_BATCH_SIZE
+
+    results = {}
+    for profile in ('stock', 'tuned'):
+        path = os.path.join(workdir, f"contention-{profile}.db")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        url = f"sqlite:///{path}"
+        engine = create_sqlite_engine(url) if profile == 'tuned' else create_engine(url)
+        Dog.__table__.create(engine)
+        bulk_insert(engine, Dog.__table__, DOG_COLUMNS, generate_dogs(seed, dogs))
+
+        stop = threading.Event()
+        reads = []  # (started at, seconds), appended from every reader thread
+        errors = [0] * readers
+
+        def reader(index):
+            rng = random.Random(f"{seed}-reader-{index}")
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    with engine.connect() as connection:
+                        connection.execute(select(Dog.id, Dog.name, Dog.breed).where(Dog.id >= rng.randint(1, dogs))
+                                           .order_by(Dog.id).limit(20)).all()
+                    reads.append((start, time.perf_counter() - start))
+                except OperationalError:
+                    errors[index] += 1
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+
+        # One transaction upserting batch after batch, like sync_table, held open for the whole window
+        written = 0
+        write_start = time.perf_counter()
+        with engine.begin() as connection:
+            batches = itertools.chain.from_iterable(
+                generate_dogs(seed + 1, dogs, start, SYNC_BATCH_SIZE) for start in itertools.count(dogs, dogs))
+            for batch in batches:
+                rows = []
+                for row in batch:
+                    values = dict(zip(DOG_COLUMNS, row), id=written % dogs + 1)
+                    values['created_at'] = values['updated_at'] = datetime.fromisoformat(values['created_at'])
+                    rows.append(values)
+                    written += 1
+                upsert_rows(connection, Dog, rows)
+                if time.perf_counter() - write_start > seconds:
+                    break
+        write_end = time.perf_counter()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+        # Reads issued while the write transaction was open, however long they then waited
+        during = sorted(seconds for started, seconds in reads if write_start <= started <= write_end)
+        elapsed = write_end - write_start
+        results[profile] = {
+            "reads": len(during),
+            "rps": round(len(during) / elapsed, 1),
+            "p50_ms": round(percentile(during, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(during, 0.99) * 1000, 2),
+            "max_ms": round(during[-1] * 1000, 2) if during else 0.0,
+            "errors": sum(errors),
+            "rows_written": written,
+            "write_seconds": round(elapsed, 2),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return lines describing regressions beyond tolerance against a baseline"""
+    regressions = []
+    for size, scenarios in results.items():
+        for name, current in scenarios.items():
+            previous = baseline.get(size, {}).get(name)
+            if not previous:
+                continue
+            for metric in ('p50_ms', 'p99_ms'):
+                if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(f"dogs={size} {name}: {metric} {previous[metric]} -> {current[metric]}")
+            if previous["rps"] and current["rps"] < previous["rps"] * (1 - tolerance):
+                regressions.append(f"dogs={size} {name}: rps {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+def print_table(size, scenarios, baseline):
+    print(f"\n=== {size} dogs ===")
+    print(f"{'scenario':<14} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} {'p50 vs base':>12}")
+    for name, stats in scenarios.items():
+        previous = baseline.get(size, {}).get(name) if baseline else None
+        delta = ''
+        if previous and previous["p50_ms"]:
+            delta = f"{(stats['p50_ms'] / previous['p50_ms'] - 1) * 100:+.1f}%"
+        print(f"{name:<14} {stats['rps']:>9} {stats['p50_ms']:>9} {stats['p99_ms']:>9} {stats['errors']:>7} {delta:>12}")
+
+
+def print_contention(dogs, results):
+    print(f"\n=== Reads during a sync write, {dogs} dogs ===")
+    print(f"{'profile':<8} {'reads/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7} {'rows written':>13}")
+    for profile, stats in results.items():
+        print(f"{profile:<8} {stats['rps']:>9} {stats['p50_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9} "
+              f"{stats['errors']:>7} {stats['rows_written']:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dogs', type=int, nargs='+', default=[1000], help='Dataset sizes, e.g. 1000 100000 1000000')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--full-list-max', type=int, default=10000,
+                        help='Skip catalog_full above this many dogs (it returns every row)')
+    parser.add_argument('--server', action='store_true', help='Go through a threaded WSGI server instead of the test client')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stub-delay', type=float, default=0.005, help='Seconds per token from the chat stub')
+    parser.add_argument('--workdir', help='Keep the database here (default: a temporary directory)')
+    parser.add_argument('--baseline', help='Compare against this results file; exit 1 on regressions')
+    parser.add_argument('--save-baseline', help='Write the results to this file')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed slowdown before a regression is reported')
+    parser.add_argument('--sync-contention', type=float, metavar='SECONDS',
+                        help='Only benchmark replica reads during a sync write held open this long')
+    args = parser.parse_args()
+
+    if args.sync_contention:
+        workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='adoptease-bench-')
+        os.makedirs(workdir, exist_ok=True)
+        for size in sorted(args.dogs):
+            results = run_sync_contention(workdir, size, args.sync_contention, args.concurrency, args.seed)
+            print_contention(size, results)
+        return
+
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.stub_delay, 10))
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='adoptease-bench-')
+    prepare_environment(workdir, f"http://127.0.0.1:{stub.server_port}/v1")
+
+    import logging
+    logging.disable(logging.WARNING)
+    import app as appmod
+
+    emails = seed_users(appmod, max(args.concurrency, 20))
+    if args.server:
+        server, base_url = start_server(appmod.app)
+        transport = HttpTransport(base_url)
+        print(f"Serving on {base_url}")
+    else:
+        transport = TestClientTransport(appmod.app)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    for size in sorted(args.dogs):
+        start = time.perf_counter()
+        inserted = seed_dogs(appmod, size, args.seed)
+        print(f"\nSeeded {inserted} dogs in {time.perf_counter() - start:.1f}s ({workdir})")
+
+        context = {
+            "dogs": size,
+            "emails": emails,
+            "admin_headers": login(transport, ADMIN_EMAIL),
+            "customer_headers": [login(transport, email) for email in emails[:args.concurrency]],
+        }
+        scenarios = {}
+        for name in args.scenarios:
+            if name == 'catalog_full' and size > args.full_list_max:
+                continue
+            scenarios[name] = run_scenario(transport, name, context, args.requests, args.concurrency, args.seed)
+        results[str(size)] = scenarios
+        print_table(str(size), scenarios, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
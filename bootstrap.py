@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; fall back to a per-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def default_boot_id(code_paths):
+    """Identify this deployment when BOOT_ID is not set
+
+    Workers forked from one master share the master's pid and start time; the
+    newest modification time of code_paths changes with every code deploy. A
+    process without a forking master (parent pid 0 or 1, as in containers) uses
+    its own pid and start time, so each start gets a new id.
+    """
+    pid = os.getppid()
+    if pid <= 1:
+        pid = os.getpid()
+    started = ''
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Field 22, counted after the parenthesised command name, is the start time in clock ticks
+            started = f.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        pass
+    version = max((os.path.getmtime(path) for path in code_paths if os.path.exists(path)), default=0)
+    return f"{pid}:{started}:{version:.0f}"
+
+
+class Bootstrap:
+    """One-time startup work (schema, admin user, replica sync) run off the import path
+
+    Steps run once per process in a background thread inside an app context.
+    Across worker processes a file lock serializes them, and a marker file
+    records the boot id that completed them, so workers forked from the same
+    master skip work another worker already did. Each step is a (name, fn,
+    check) tuple: even with a matching marker a step is run again when its
+    check() returns False, e.g. because the database was replaced; steps
+    without a check are skipped.
+    """
+
+    def __init__(self, app, steps, lock_path, boot_id):
+        self.app = app
+        self.steps = steps
+        self.lock_path = lock_path
+        self.marker_path = lock_path + '.done'
+        self.boot_id = boot_id
+        self.state = 'pending'
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.progress = [{"name": name, "status": "pending"} for name, _, _ in steps]
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self, background=True):
+        """Run the steps, in a daemon thread unless background is False"""
+        with self._lock:
+            if self.state != 'pending':
+                return
+            self.state = 'running'
+            self.started_at = time.time()
+        if background:
+            threading.Thread(target=self._run, name='bootstrap', daemon=True).start()
+        else:
+            self._run()
+
+    def _already_done(self):
+        try:
+            with open(self.marker_path) as f:
+                return f.read().strip() == self.boot_id
+        except OSError:
+            return False
+
+    def _run(self):
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            already_done = self._already_done()
+            if already_done:
+                logger.info("Bootstrap already completed by another worker; checking its results")
+            with self.app.app_context():
+                for step, (name, fn, check) in zip(self.progress, self.steps):
+                    if already_done and (check is None or check()):
+                        step["status"] = "skipped"
+                        continue
+                    step["status"] = "running"
+                    step_start = time.perf_counter()
+                    fn()
+                    step["seconds"] = round(time.perf_counter() - step_start, 3)
+                    step["status"] = "done"
+            if not already_done:
+                with open(self.marker_path, 'w') as f:
+                    f.write(self.boot_id)
+            self.state = 'ready'
+            logger.info(f"Bootstrap finished in {time.time() - self.started_at:.2f}s")
+        except Exception as e:
+            self.state = 'failed'
+            self.error = str(e)
+            for step in self.progress:
+                if step["status"] == "running":
+                    step["status"] = "failed"
+            logger.error(f"Error during database initialization: {str(e)}")
+        finally:
+            self.finished_at = time.time()
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+            self._ready.set()
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def wait(self, timeout):
+        """Block until bootstrap finishes or timeout passes; return True when ready"""
+        if not self._ready.is_set():
+            self._ready.wait(timeout)
+        return self.ready
+
+    def status(self):
+        """Describe bootstrap progress for the health endpoints"""
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "state": self.state,
+            "error": self.error,
+            "elapsed_seconds": elapsed,
+            "pid": os.getpid(),
+            "steps": self.progress,
+        }
@@ -0,0 +1,335 @@
+import base64
+import binascii
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import tuple_
+from background_rebuild import BackgroundRebuild
+from sync_databases import Dog
+
+# Columns the catalog can be sorted by, keyed by the name used in ?sort=<key>_<asc|desc>
+SORT_COLUMNS = {
+    'id': Dog.id,
+    'age': Dog.age,
+    'height': Dog.height,
+    'weight': Dog.weight,
+    'created': Dog.created_at,
+    'name': Dog.name,
+}
+
+# Filter keys understood by filter_dogs
+CATALOG_FILTERS = ('breed', 'color', 'gender', 'min_age', 'max_age', 'min_weight', 'max_weight')
+
+# Query parameters that switch a listing endpoint into paginated mode
+CATALOG_PARAMS = CATALOG_FILTERS + ('sort', 'limit', 'cursor')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def is_catalog_query(args):
+    """Check whether the request asks for a filtered/paginated listing"""
+    return any(name in args for name in CATALOG_PARAMS)
+
+
+def serialize_dog(dog):
+    """Convert a Dog row into the dict returned by the listing endpoints"""
+    return {
+        "id": dog.id,
+        "name": dog.name,
+        "breed": dog.breed,
+        "gender": dog.gender,
+        "age": dog.age,
+        "color": dog.color,
+        "height": dog.height,
+        "weight": dog.weight,
+        "vaccines": dog.vaccines,
+        "diseases": dog.diseases,
+        "medical_history": dog.medical_history,
+        "personality": dog.personality,
+        "created_at": dog.created_at
+    }
+
+
+def _parse_number(args, name, cast):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def encode_cursor(sort_key, dog, columns=SORT_COLUMNS):
+    """Build an opaque cursor pointing just after the given row"""
+    value = getattr(dog, columns[sort_key].key)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps({"s": sort_key, "v": value, "id": dog.id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_key):
+    """Return the (sort value, id) pair stored in a cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, dog_id = data["v"], int(data["id"])
+        # A tampered cursor must not put a list or object into the SQL bind
+        if value is not None and not isinstance(value, (str, int, float)):
+            raise TypeError
+        if data["s"] != sort_key:
+            raise ValueError("cursor does not match the requested sort")
+        if sort_key == 'created':
+            value = datetime.fromisoformat(value)
+        return value, dog_id
+    except (binascii.Error, json.JSONDecodeError, KeyError, TypeError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_catalog_params(args):
+    """Validate listing query parameters, raising ValueError on bad input"""
+    sort = args.get('sort', 'id_asc')
+    sort_key, _, direction = sort.rpartition('_')
+    if sort_key not in SORT_COLUMNS or direction not in ('asc', 'desc'):
+        raise ValueError(f"Unsupported sort: {sort}")
+
+    limit = _parse_number(args, 'limit', int)
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    elif limit < 1:
+        raise ValueError("limit must be positive")
+
+    gender = args.get('gender') or None
+    if gender and gender not in ['Male', 'Female']:
+        raise ValueError("Gender must be either Male or Female")
+
+    params = {
+        "breed": args.get('breed') or None,
+        "color": args.get('color') or None,
+        "gender": gender,
+        "min_age": _parse_number(args, 'min_age', int),
+        "max_age": _parse_number(args, 'max_age', int),
+        "min_weight": _parse_number(args, 'min_weight', float),
+        "max_weight": _parse_number(args, 'max_weight', float),
+        "sort_key": sort_key,
+        "descending": direction == 'desc',
+        "limit": min(limit, MAX_PAGE_SIZE),
+        "after": None,
+    }
+    if args.get('cursor'):
+        params["after"] = decode_cursor(args['cursor'], sort_key)
+    return params
+
+
+def filter_dogs(query, params):
+    """Apply the breed/color/gender and range filters to a Dog query"""
+    if params["breed"]:
+        query = query.filter(Dog.breed == params["breed"])
+    if params["color"]:
+        query = query.filter(Dog.color == params["color"])
+    if params["gender"]:
+        query = query.filter(Dog.gender == params["gender"])
+    if params["min_age"] is not None:
+        query = query.filter(Dog.age >= params["min_age"])
+    if params["max_age"] is not None:
+        query = query.filter(Dog.age <= params["max_age"])
+    if params["min_weight"] is not None:
+        query = query.filter(Dog.weight >= params["min_weight"])
+    if params["max_weight"] is not None:
+        query = query.filter(Dog.weight <= params["max_weight"])
+    return query
+
+
+def fetch_dog_page(query, params):
+    """Run a keyset-paginated listing and return (dogs, next_cursor)
+
+    Rows are ordered by the sort column with the primary key as tie-breaker,
+    both in the same direction, so each page is a range scan over the
+    matching (column, id) index instead of an OFFSET over the whole table.
+    """
+    column = SORT_COLUMNS[params["sort_key"]]
+    query = filter_dogs(query, params)
+
+    if params["sort_key"] == 'id':
+        key = Dog.id
+        after = params["after"][1] if params["after"] else None
+        order = [Dog.id.desc() if params["descending"] else Dog.id.asc()]
+    else:
+        key = tuple_(column, Dog.id)
+        after = tuple_(*params["after"]) if params["after"] else None
+        if params["descending"]:
+            order = [column.desc(), Dog.id.desc()]
+        else:
+            order = [column.asc(), Dog.id.asc()]
+
+    if after is not None:
+        query = query.filter(key < after if params["descending"] else key > after)
+
+    # Fetch one extra row to learn whether another page exists
+    dogs = query.order_by(*order).limit(params["limit"] + 1).all()
+    next_cursor = None
+    if len(dogs) > params["limit"]:
+        dogs = dogs[:params["limit"]]
+        next_cursor = encode_cursor(params["sort_key"], dogs[-1])
+    return dogs, next_cursor
+
+
+class ListingCache:
+    """In-process LRU cache of encoded dog listings keyed by catalog version
+
+    Every dog write bumps the version, which drops all cached bodies. Entries are
+    stored with a strong ETag derived from the encoded bytes so conditional
+    requests can be answered without rebuilding the listing. Writes made by other
+    processes never bump the version here, so entries also expire after
+    `max_age` seconds.
+    """
+
+    def __init__(self, max_entries=256, max_age=30):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """Mark the catalog as changed and forget every cached listing"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def on_dog_change(self, kind, ids, fields):
+        """DogChangeHub listener: any dog write invalidates every listing"""
+        self.bump()
+
+    def get(self, key):
+        """Return (etag, body) for a fresh listing of the current version, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[2] > self.max_age:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key, body, version):
+        """Store a body built at the given version and return (etag, body)"""
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            # Skip bodies that were built while a write bumped the version
+            if version == self.version:
+                self._entries[key] = (etag, body, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body
+
+
+# Age ranges reported as facets, as (label, youngest, oldest); labels match min_age/max_age filters
+AGE_BUCKETS = (('0-1', 0, 1), ('2-3', 2, 3), ('4-7', 4, 7), ('8+', 8, None))
+
+# Columns remembered per dog to adjust the counts when it changes
+FACET_COLUMNS = ('breed', 'color', 'gender', 'age')
+FACET_NAMES = ('breed', 'color', 'gender', 'age')
+
+
+def age_bucket(age):
+    """Return the AGE_BUCKETS label for an age, or None when unknown"""
+    if age is None:
+        return None
+    for label, youngest, oldest in AGE_BUCKETS:
+        if age >= youngest and (oldest is None or age <= oldest):
+            return label
+    return None
+
+
+class FacetCounts:
+    """Dog counts per breed, color, gender and age bucket, kept current by dog writes
+
+    The counts are built once from `loader()` (rows of id, breed, color, gender,
+    age) and then adjusted from each DogChangeHub event using the values
+    remembered for every dog, so serving facets never runs a GROUP BY. They are
+    rebuilt by a BackgroundRebuild after `max_age` seconds to pick up writes
+    made by other processes.
+    """
+
+    def __init__(self, loader, max_age=300):
+        self.loader = loader
+        self.max_age = max_age
+        self.version = 0
+        self._dogs = {}  # dog id -> facet column values
+        self._counts = {name: {} for name in FACET_NAMES}
+        self._body = None  # (version, etag, encoded body)
+        self._lock = threading.Lock()
+        self._rebuild = BackgroundRebuild("facet counts", self._lock, self._load, FacetCounts._apply, self._swap, max_age)
+
+    def _add(self, values, delta):
+        breed, color, gender, age = values
+        for name, value in zip(FACET_NAMES, (breed, color, gender, age_bucket(age))):
+            if value is None or value == '':
+                continue
+            counts = self._counts[name]
+            counts[value] = counts.get(value, 0) + delta
+            if counts[value] <= 0:
+                del counts[value]
+
+    def _load(self):
+        """Return new FacetCounts holding the current counts from the loader"""
+        fresh = FacetCounts(self.loader, self.max_age)
+        fresh._dogs = {row.id: tuple(getattr(row, column) for column in FACET_COLUMNS) for row in self.loader()}
+        for values in fresh._dogs.values():
+            fresh._add(values, 1)
+        return fresh
+
+    def _swap(self, fresh):
+        self._dogs, self._counts = fresh._dogs, fresh._counts
+        self.version += 1
+
+    def _apply(self, kind, ids, fields):
+        """Adjust the counts for one write; return False when only a rebuild can account for it"""
+        if kind == 'reload' or ids is None:
+            return False
+        if kind == 'update' and not any(column in (fields or {}) for column in FACET_COLUMNS):
+            return True
+        for dog_id in ids:
+            old = self._dogs.pop(dog_id, None)
+            if old is not None:
+                self._add(old, -1)
+            if kind == 'delete':
+                continue
+            if old is None and kind == 'update':
+                # A dog this process never saw; only a reload gives its other columns
+                return False
+            base = dict(zip(FACET_COLUMNS, old)) if old is not None else {}
+            new = tuple(fields.get(column, base.get(column)) for column in FACET_COLUMNS)
+            self._dogs[dog_id] = new
+            self._add(new, 1)
+        self.version += 1
+        return True
+
+    def on_dog_change(self, kind, ids, fields):
+        """DogChangeHub listener: apply a write to the counts"""
+        with self._lock:
+            if self._rebuild.built_at is None:
+                return  # Nothing built yet; the first read loads current data
+            self._rebuild.record(kind, ids, fields)
+            if not self._rebuild.expired and not self._apply(kind, ids, fields):
+                self._rebuild.expired = True
+
+    def snapshot(self):
+        """Return (etag, encoded JSON body) for the current counts"""
+        with self._lock:
+            self._rebuild.refresh()
+            if self._body is None or self._body[0] != self.version:
+                payload = {name: dict(sorted(counts.items())) for name, counts in self._counts.items()}
+                payload["age"] = {label: payload["age"].get(label, 0) for label, _, _ in AGE_BUCKETS}
+                payload["total"] = len(self._dogs)
+                body = (json.dumps(payload) + "\n").encode()
+                self._body = (self.version, hashlib.sha1(body).hexdigest(), body)
+            return self._body[1], self._body[2]
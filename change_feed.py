@@ -0,0 +1,128 @@
+"""Live feed of dog changes for open catalog pages
+
+Every DogChangeHub event gets the next sequence number and goes into a
+bounded ring buffer. Clients stream the feed as server-sent events and resume
+after a disconnect by passing back the cursor of the last event they applied.
+A cursor is "<feed id>:<sequence>"; the feed id changes when the process
+restarts, so a cursor from another process or one that has fallen out of the
+buffer yields a "reset" event, telling the client to reload its list.
+
+The feed is a long-poll: a request returns as soon as it has sent some
+events, or after max_seconds without any, and the client polls again with its
+cursor. Each open poll holds a request thread, so at most max_streams are
+served at once and open() refuses the rest. Writes made by other processes
+never reach this feed; the "ready" event tells clients how often to reload
+their list anyway (resync seconds, 0 for never).
+"""
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class ChangeFeed:
+    """Bounded in-memory log of dog changes with blocking reads for streams"""
+
+    def __init__(self, capacity=1000, dumps=json.dumps, max_streams=8, resync=0):
+        self.dumps = dumps  # Pass the app's JSON encoder so dates match the listing endpoints
+        self.max_streams = max_streams
+        self.resync = resync
+        self.feed_id = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.events = deque(maxlen=capacity)
+        self.streams = 0
+        self.refused = 0
+        self._changed = threading.Condition()
+
+    def open(self):
+        """Reserve a stream slot; return False when max_streams are already open"""
+        with self._changed:
+            if self.streams >= self.max_streams:
+                self.refused += 1
+                return False
+            self.streams += 1
+            return True
+
+    def close(self):
+        """Release a slot reserved by open()"""
+        with self._changed:
+            self.streams -= 1
+
+    def cursor(self, seq):
+        return f"{self.feed_id}:{seq}"
+
+    def on_dog_change(self, kind, ids, fields):
+        """DogChangeHub listener: record the change, encoded once for every stream, and wake the streams"""
+        with self._changed:
+            self.seq += 1
+            cursor = self.cursor(self.seq)
+            data = self.dumps({"cursor": cursor, "kind": kind, "ids": ids, "fields": fields}, separators=(',', ':'))
+            self.events.append(f"id: {cursor}\nevent: dog\ndata: {data}\n\n")
+            self._changed.notify_all()
+
+    def parse(self, cursor):
+        """Return the sequence number in a cursor from this feed, else None"""
+        feed_id, _, seq = (cursor or '').partition(':')
+        if feed_id != self.feed_id or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        return int(seq)
+
+    def since(self, seq):
+        """Return the events after seq, or None if some were already dropped from the buffer"""
+        with self._changed:
+            oldest = self.seq - len(self.events) + 1
+            if seq < oldest - 1:
+                return None
+            return list(itertools.islice(self.events, seq - oldest + 1, None))
+
+    def wait(self, seq, timeout):
+        """Like since(), but block up to timeout seconds for an event after seq"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.seq > seq, timeout)
+        return self.since(seq)
+
+    def stream(self, cursor=None, heartbeat=15, max_seconds=25):
+        """Yield server-sent events for one poll: "ready", then the changes after cursor
+
+        Without a cursor the poll starts at the current position. A cursor
+        that cannot be resumed produces "reset" with a fresh cursor instead.
+        The poll ends once it has sent changes or a reset, or after
+        max_seconds; comment lines are sent every heartbeat seconds while idle.
+        """
+        deadline = time.monotonic() + max_seconds
+        seq = self.parse(cursor)
+        reset = seq is None or self.since(seq) is None
+        if reset:
+            seq = self.seq
+        ready = json.dumps({'cursor': self.cursor(seq), 'resync': self.resync})
+        yield f"event: ready\ndata: {ready}\n\n"
+        if reset and cursor:
+            yield f"event: reset\ndata: {json.dumps({'cursor': self.cursor(seq)})}\n\n"
+            return
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events = self.wait(seq, min(heartbeat, remaining))
+            if events is None:
+                # This client fell further behind than the buffer holds
+                yield f"event: reset\ndata: {json.dumps({'cursor': self.cursor(self.seq)})}\n\n"
+                return
+            if events:
+                yield ''.join(events)
+                return
+            yield ": keepalive\n\n"
+
+    def stats(self):
+        with self._changed:
+            return {
+                "feed_id": self.feed_id,
+                "seq": self.seq,
+                "buffered": len(self.events),
+                "streams": self.streams,
+                "max_streams": self.max_streams,
+                "refused": self.refused,
+            }
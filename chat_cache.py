@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_message(message):
+    """Case- and whitespace-fold a chat message into a cache key"""
+    return ' '.join(message.casefold().split())
+
+
+def shingles(normalized, size=3):
+    """Return the set of word shingles used for near-duplicate matching"""
+    words = normalized.split()
+    if len(words) <= size:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class ChatResponseCache:
+    """LRU cache of chat answers with a TTL and a total size cap in bytes
+
+    Lookups match on the normalized message. When similarity is above zero a
+    miss falls back to the cached question with the highest Jaccard similarity
+    over word shingles, found through an inverted shingle index, and is a hit
+    if that similarity reaches the threshold.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 * 1024, ttl=3600, similarity=0.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity = similarity
+        self.size_bytes = 0
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, response, shingles, size)
+        self._shingle_index = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, _, key_shingles, size = self._entries.pop(key)
+        self.size_bytes -= size
+        for shingle in key_shingles:
+            keys = self._shingle_index.get(shingle)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._shingle_index[shingle]
+
+    def _live_entry(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _nearest_key(self, key_shingles, now):
+        overlaps = {}
+        for shingle in key_shingles:
+            for candidate in self._shingle_index.get(shingle, ()):
+                overlaps[candidate] = overlaps.get(candidate, 0) + 1
+
+        best_key, best_score = None, 0.0
+        for candidate, overlap in overlaps.items():
+            entry = self._live_entry(candidate, now)
+            if entry is None:
+                continue
+            score = overlap / (len(key_shingles) + len(entry[2]) - overlap)
+            if score > best_score:
+                best_key, best_score = candidate, score
+        return best_key if best_score >= self.similarity else None
+
+    def get(self, message):
+        """Return the cached answer for a message, or None"""
+        key = normalize_message(message)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live_entry(key, now)
+            if entry is None and self.similarity > 0:
+                near_key = self._nearest_key(shingles(key), now)
+                if near_key is not None:
+                    self.near_hits += 1
+                    key, entry = near_key, self._entries[near_key]
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, message, response):
+        """Cache an answer, evicting least recently used entries to fit"""
+        key = normalize_message(message)
+        size = len(key.encode()) + len(response.encode())
+        if size > self.max_bytes:
+            return
+        key_shingles = shingles(key)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self.size_bytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + self.ttl, response, key_shingles, size)
+            self.size_bytes += size
+            for shingle in key_shingles:
+                self._shingle_index.setdefault(shingle, set()).add(key)
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
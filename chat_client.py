@@ -0,0 +1,99 @@
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ChatServiceError(Exception):
+    """Raised when the upstream chat completion service fails"""
+
+
+class ChatClient:
+    """Keep-alive client for an OpenAI-compatible chat completions API
+
+    A single requests.Session is shared by all request threads so TLS
+    connections to the upstream are pooled and reused. Connection failures are
+    retried with exponential backoff, as are 429/503 answers that carry a
+    Retry-After header; other errors such as 502/504 are not, since the upstream
+    may already have run (and billed) the completion. Every call has connect and
+    read timeouts so a stalled upstream cannot hold a worker forever.
+    """
+
+    def __init__(self, base_url, api_key, model, pool_size=10, connect_timeout=3.05,
+                 read_timeout=60, retries=2, backoff_factor=0.5):
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.api_key = api_key
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # Never replay a request the upstream may already be answering
+            status=retries,
+            backoff_factor=backoff_factor,
+            # Without a forcelist only 429/503 with Retry-After are retried: the request was refused, not run
+            status_forcelist=None,
+            allowed_methods=["POST"],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _post(self, messages, stream):
+        try:
+            response = self.session.post(
+                self.url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                json={"model": self.model, "messages": messages, "stream": stream},
+                timeout=self.timeout,
+                stream=stream
+            )
+        except requests.RequestException as e:
+            raise ChatServiceError(f"Request to chat service failed: {str(e)}")
+
+        if response.status_code != 200:
+            text = response.text
+            response.close()
+            raise ChatServiceError(f"Chat service returned {response.status_code}: {text}")
+        return response
+
+    def complete(self, messages):
+        """Return the full completion text for a list of chat messages"""
+        response = self._post(messages, stream=False)
+        try:
+            return response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise ChatServiceError(f"Unexpected chat service response: {str(e)}")
+
+    def stream(self, messages):
+        """Yield completion text fragments as the upstream produces them"""
+        response = self._post(messages, stream=True)
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # Server-sent events: skip keep-alive comments and blank separators
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                if "error" in chunk:
+                    raise ChatServiceError(f"Chat service error: {chunk['error']}")
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        except requests.RequestException as e:
+            raise ChatServiceError(f"Chat stream interrupted: {str(e)}")
+        finally:
+            response.close()
@@ -0,0 +1,174 @@
+import math
+import threading
+import time
+
+
+class UpstreamBusy(Exception):
+    """Raised when a chat request cannot get an upstream slot in time"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent upstream calls globally and per user, with a bounded wait queue
+
+    A user already holding per_user slots is rejected with 429. When all
+    max_concurrent slots are busy, up to max_queue callers wait for one (at most
+    queue_timeout seconds); anyone beyond that is rejected with 503 right away.
+    Coalesced followers, which wait on another caller's upstream call instead of
+    making their own, take a queue place and a per-user slot the same way.
+    """
+
+    def __init__(self, max_concurrent=8, per_user=2, max_queue=16, queue_timeout=10):
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.following = 0
+        self.rejected_user = 0
+        self.rejected_queue = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_count = 0
+        self.hold_total = 0.0
+        self._per_user = {}
+        self._cond = threading.Condition()
+
+    def _retry_after(self):
+        # Estimate how long the queue ahead needs to drain, in whole seconds
+        average_hold = self.hold_total / self.hold_count if self.hold_count else 1.0
+        return max(1, math.ceil(average_hold * (self.waiting + 1) / self.max_concurrent))
+
+    def _release_user(self, user_key):
+        self._per_user[user_key] -= 1
+        if not self._per_user[user_key]:
+            del self._per_user[user_key]
+
+    def acquire(self, user_key):
+        """Wait for an upstream slot and return a token to pass to release()"""
+        start = time.monotonic()
+        with self._cond:
+            if self._per_user.get(user_key, 0) >= self.per_user:
+                self.rejected_user += 1
+                raise UpstreamBusy("Too many chat requests in progress", 429, self._retry_after())
+            if self.active >= self.max_concurrent and self.waiting >= self.max_queue:
+                self.rejected_queue += 1
+                raise UpstreamBusy("Chat service is busy", 503, self._retry_after())
+
+            self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+            self.waiting += 1
+            try:
+                deadline = start + self.queue_timeout
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        self._release_user(user_key)
+                        raise UpstreamBusy("Chat service is busy", 503, self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self.active += 1
+            waited = time.monotonic() - start
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return user_key, time.monotonic()
+
+    def acquire_follower(self, user_key):
+        """Take a queue place and user slot for a caller waiting on a coalesced request"""
+        with self._cond:
+            if self._per_user.get(user_key, 0) >= self.per_user:
+                self.rejected_user += 1
+                raise UpstreamBusy("Too many chat requests in progress", 429, self._retry_after())
+            if self.waiting >= self.max_queue:
+                self.rejected_queue += 1
+                raise UpstreamBusy("Chat service is busy", 503, self._retry_after())
+            self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+            self.waiting += 1
+            self.following += 1
+        return user_key
+
+    def release_follower(self, token):
+        """Give back what acquire_follower() took"""
+        with self._cond:
+            self.waiting -= 1
+            self.following -= 1
+            self._release_user(token)
+
+    def release(self, token):
+        """Give back a slot taken with acquire()"""
+        user_key, acquired_at = token
+        with self._cond:
+            self.active -= 1
+            self._release_user(user_key)
+            self.hold_count += 1
+            self.hold_total += time.monotonic() - acquired_at
+            self._cond.notify()
+
+    def stats(self):
+        """Return queue depth, rejection counters and wait times"""
+        with self._cond:
+            return {
+                "active": self.active,
+                "queue_depth": self.waiting,
+                "following": self.following,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "per_user": self.per_user,
+                "rejected_user": self.rejected_user,
+                "rejected_queue": self.rejected_queue,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": self.wait_total / self.wait_count * 1000 if self.wait_count else 0.0,
+                "max_wait_ms": self.wait_max * 1000,
+                "avg_upstream_ms": self.hold_total / self.hold_count * 1000 if self.hold_count else 0.0,
+            }
+
+
+class InFlightRequest:
+    """An upstream call that identical requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """Collapses identical concurrent requests into a single upstream call
+
+    The first caller for a key becomes the leader and must call finish(); the
+    others wait on the returned InFlightRequest and reuse its result.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """Return (in-flight request, True if the caller is the leader)"""
+        with self._lock:
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._in_flight[key] = InFlightRequest()
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None):
+        """Publish the leader's result and wake every waiting follower"""
+        with self._lock:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+        flight.result = result
+        flight.error = error
+        flight.done.set()
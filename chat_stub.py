@@ -0,0 +1,78 @@
+"""Minimal OpenAI-compatible chat completions server for local testing
+
+Run it and point the app at it:
+
+    python chat_stub.py --port 8081 --delay 0.05
+    OPENROUTER_BASE_URL=http://127.0.0.1:8081/v1 OPENROUTER_API_KEY=stub python app.py
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(delay, words):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.endswith('/chat/completions'):
+                self.send_error(404)
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            question = payload.get("messages", [{}])[-1].get("content", "")
+            tokens = [f"Stub answer to: {question}."] + ["woof"] * words
+
+            if payload.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                    time.sleep(delay)
+                    chunk = {"choices": [{"delta": {"content": token + " "}}]}
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self._write_chunk("")
+                return
+
+            time.sleep(delay * len(tokens))
+            body = json.dumps({"choices": [{"message": {"role": "assistant", "content": " ".join(tokens)}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, text):
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return StubHandler
+
+
+def run_stub(host='127.0.0.1', port=8081, delay=0.05, words=20):
+    """Serve the stub until interrupted"""
+    server = ThreadingHTTPServer((host, port), make_handler(delay, words))
+    print(f"Chat stub listening on http://{host}:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--delay', type=float, default=0.05, help="Seconds between streamed tokens")
+    parser.add_argument('--words', type=int, default=20, help="Filler tokens per answer")
+    args = parser.parse_args()
+    run_stub(args.host, args.port, args.delay, args.words)
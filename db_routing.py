@@ -0,0 +1,178 @@
+"""Read/write routing between PostgreSQL and the local SQLite replica
+
+Handlers marked read-only send their plain SELECTs to the replica kept by
+sync_databases; everything else, and every statement in a flush or a write,
+goes to PostgreSQL. A request falls back to PostgreSQL when:
+
+- the replica is older than the staleness bound (REPLICA_MAX_STALENESS, or
+  less if the client sends X-Max-Staleness in seconds);
+- the client wrote within the last REPLICA_STICKY_SECONDS (read-your-writes,
+  remembered in the session cookie);
+- the request itself has already written.
+
+Replica age is the time since the oldest table's last sync. When it passes
+half the bound, an incremental sync is started in the background.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from flask import current_app, g, request, session, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from sqlite_profile import create_sqlite_engine
+
+logger = logging.getLogger(__name__)
+
+# How often the replica's sync time is re-read
+LAG_CHECK_INTERVAL = 1.0
+
+# Minimum seconds between background catch-up syncs, so a failing sync is not retried per request
+CATCH_UP_INTERVAL = 30.0
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that lets the active ReplicaRouter pick the engine"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            router = current_app.extensions.get('db_router')
+            if router is not None:
+                if self._flushing or isinstance(clause, UpdateBase):
+                    g.db_wrote = True
+                # Locking reads stay on the primary
+                elif isinstance(clause, Select) and clause._for_update_arg is None and g.get('db_replica'):
+                    return router.replica_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """Decides per request whether reads may be served by the SQLite replica"""
+
+    def __init__(self, replica_url, max_staleness=120, sticky_seconds=5, catch_up=None):
+        self.replica_engine = create_sqlite_engine(replica_url)
+        self.max_staleness = max_staleness
+        self.sticky_seconds = sticky_seconds
+        self.catch_up = catch_up
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self._synced_at = None
+        self._checked_at = 0.0
+        self._catching_up = False
+        self._caught_up_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['db_router'] = self
+        app.after_request(self._after_request)
+
+    def lag(self):
+        """Seconds since the replica was last synced, or None if it never was"""
+        now = time.monotonic()
+        if now - self._checked_at > LAG_CHECK_INTERVAL:
+            try:
+                with self.replica_engine.connect() as connection:
+                    synced_at = connection.execute(text("SELECT min(synced_at) FROM sync_state")).scalar()
+                self._synced_at = datetime.fromisoformat(synced_at) if synced_at else None
+            except Exception as e:
+                logger.warning(f"Could not read the replica sync time: {str(e)}")
+                self._synced_at = None
+            self._checked_at = now
+        if self._synced_at is None:
+            return None
+        return max(0.0, (datetime.utcnow() - self._synced_at).total_seconds())
+
+    def _staleness_bound(self):
+        bound = self.max_staleness
+        requested = request.headers.get('X-Max-Staleness')
+        if requested:
+            try:
+                bound = min(bound, float(requested))
+            except ValueError:
+                pass
+        return bound
+
+    def _start_catch_up(self):
+        with self._lock:
+            if self._catching_up or self.catch_up is None:
+                return
+            if self._caught_up_at is not None and time.monotonic() - self._caught_up_at < CATCH_UP_INTERVAL:
+                return
+            self._catching_up = True
+
+        def run():
+            try:
+                self.catch_up()
+            except Exception as e:
+                logger.error(f"Replica catch-up failed: {str(e)}")
+            finally:
+                self._checked_at = 0.0
+                self._caught_up_at = time.monotonic()
+                self._catching_up = False
+
+        threading.Thread(target=run, name="replica-catch-up", daemon=True).start()
+
+    def replica_allowed(self):
+        """True if this request's reads may go to the replica"""
+        if not has_request_context() or g.get('db_wrote'):
+            return False
+        if time.time() - session.get('last_write_at', 0) < self.sticky_seconds:
+            return False
+        lag = self.lag()
+        if lag is None or lag > self.max_staleness / 2:
+            self._start_catch_up()
+        return lag is not None and lag <= self._staleness_bound()
+
+    @contextmanager
+    def _route(self, replica):
+        previous = g.get('db_replica', False)
+        g.db_replica = replica
+        try:
+            yield replica
+        finally:
+            g.db_replica = previous
+
+    def reads(self):
+        """Route the SELECTs inside the block to the replica when allowed; yields whether they are"""
+        replica = self.replica_allowed()
+        if replica:
+            self.replica_reads += 1
+        else:
+            self.primary_reads += 1
+        g.db_read_source = 'replica' if replica else 'primary'
+        return self._route(replica)
+
+    def primary(self):
+        """Send the SELECTs inside the block to the primary, even within a read-only handler"""
+        return self._route(False)
+
+    def read_only(self, f):
+        """Decorator for handlers whose queries can all be served by the replica"""
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with self.reads():
+                return f(*args, **kwargs)
+        return decorated
+
+    def _after_request(self, response):
+        if g.get('db_wrote'):
+            # Read-your-writes: this client's next reads stay on the primary for a while
+            session['last_write_at'] = time.time()
+        if g.get('db_read_source'):
+            response.headers['X-Read-Source'] = g.db_read_source
+        return response
+
+    def stats(self):
+        lag = self.lag()
+        return {
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "lag_seconds": round(lag, 1) if lag is not None else None,
+            "max_staleness": self.max_staleness,
+            "sticky_seconds": self.sticky_seconds,
+            "catching_up": self._catching_up,
+        }
@@ -0,0 +1,111 @@
+/**
+ * Live dog changes for the catalog pages
+ *
+ * followDogChanges() long-polls /api/dogs/changes and calls onChange for
+ * every insert, update or delete, so a page can patch the list it loaded with
+ * applyDogChange() instead of refetching it. The page loads its list on its
+ * own; onReset is called when it has to reload the whole list: after a bulk
+ * import, whenever the server cannot resume from the last change seen, and
+ * every few minutes (as the server asks) to pick up writes handled by other
+ * server processes.
+ */
+
+// Returns the list with one change event applied
+function applyDogChange(dogs, change) {
+  if (change.kind === 'delete') {
+    const removed = new Set(change.ids);
+    return dogs.filter(dog => !removed.has(dog.id));
+  }
+  if (change.kind === 'insert') {
+    return dogs.filter(dog => dog.id !== change.fields.id).concat([change.fields]);
+  }
+  if (change.kind === 'update') {
+    const changed = new Set(change.ids);
+    return dogs.map(dog => changed.has(dog.id) ? { ...dog, ...change.fields } : dog);
+  }
+  return dogs;
+}
+
+function followDogChanges(token, { onChange, onReset }) {
+  let cursor = null;
+  let nextResync = null;
+
+  function reload() {
+    nextResync = null;
+    onReset();
+  }
+
+  function handleEvent(rawEvent) {
+    let eventType = 'message';
+    let data = '';
+    rawEvent.split('\n').forEach(line => {
+      if (line.startsWith('event:')) eventType = line.slice(6).trim();
+      if (line.startsWith('data:')) data += line.slice(5).trim();
+    });
+    if (!data) return;  // Keepalive comment
+
+    const payload = JSON.parse(data);
+    if (eventType === 'ready') {
+      cursor = payload.cursor;
+      if (payload.resync > 0) {
+        // Spread the reloads of many open pages over a window
+        if (nextResync === null) {
+          nextResync = Date.now() + payload.resync * 1000 * (1 + Math.random() / 2);
+        } else if (Date.now() > nextResync) {
+          reload();
+        }
+      }
+    } else if (eventType === 'reset') {
+      cursor = payload.cursor;
+      reload();
+    } else if (eventType === 'dog') {
+      cursor = payload.cursor;
+      if (payload.kind === 'reload') {
+        reload();
+      } else {
+        onChange(payload);
+      }
+    }
+  }
+
+  function poll() {
+    const url = cursor !== null ? `/api/dogs/changes?cursor=${encodeURIComponent(cursor)}` : '/api/dogs/changes';
+    fetch(url, {
+      headers: { Authorization: `Bearer ${token}` }
+    })
+      .then(response => {
+        if (response.status === 503) {
+          // Every poll slot on the server is taken; come back when it suggests
+          const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 5;
+          return retryAfter * 1000 * (1 + Math.random());
+        }
+        if (!response.ok) {
+          throw new Error(`Change feed unavailable (${response.status})`);
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        // Each server-sent event is separated by a blank line
+        function readChunk() {
+          return reader.read().then(({ done, value }) => {
+            if (done) return 0;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            events.forEach(handleEvent);
+            return readChunk();
+          });
+        }
+        return readChunk();
+      })
+      // Each poll ends after some changes or a quiet spell; ask again from the last change seen
+      .then(delay => setTimeout(poll, delay))
+      .catch(err => {
+        console.error('Dog change feed error:', err);
+        setTimeout(poll, 5000);
+      });
+  }
+
+  poll();
+}
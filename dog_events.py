@@ -0,0 +1,37 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Kinds of dog change; "reload" means many rows changed at once (e.g. a bulk
+# import) and listeners should rebuild instead of applying a delta
+DOG_CHANGE_KINDS = ('insert', 'update', 'delete', 'reload')
+
+
+class DogChangeHub:
+    """Fans committed dog writes out to in-process listeners
+
+    Write handlers publish after their transaction commits; caches, indexes and
+    feeds subscribe to stay current without re-reading the catalog. A listener
+    gets (kind, ids, fields): the affected dog ids (None for reload) and the
+    written values (the whole row for inserts, the changed columns for updates).
+    """
+
+    def __init__(self):
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+        return listener
+
+    def publish(self, kind, ids=None, fields=None):
+        if kind not in DOG_CHANGE_KINDS:
+            raise ValueError(f"Unknown dog change: {kind}")
+        # A failing listener must not turn a committed write into an error response
+        for listener in self._listeners:
+            try:
+                listener(kind, ids, fields)
+            except Exception as e:
+                logger.error(f"Dog change listener {getattr(listener, '__name__', listener)} failed: {str(e)}")
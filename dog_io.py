@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+# Columns accepted by the bulk import and written by the export, in CSV order
+DOG_FIELDS = ['id', 'name', 'breed', 'gender', 'age', 'color', 'height', 'weight',
+              'vaccines', 'diseases', 'medical_history', 'personality', 'created_at']
+
+# CSV cells are text, so numeric columns are converted before validation
+NUMERIC_FIELDS = {'age': int, 'height': float, 'weight': float}
+
+
+def iter_ndjson_rows(stream):
+    """Yield (row number, dict or None, parse error or None) for an NDJSON body"""
+    reader = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    for row_number, line in enumerate(reader, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(data, dict):
+            yield row_number, None, "Each line must be a JSON object"
+            continue
+        yield row_number, data, None
+
+
+def iter_csv_rows(stream):
+    """Yield (row number, dict or None, parse error or None) for a CSV body with a header row"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    for row_number, row in enumerate(reader, start=1):
+        data = {key: value for key, value in row.items() if key is not None and value != ''}
+        for field, cast in NUMERIC_FIELDS.items():
+            if field in data:
+                try:
+                    data[field] = cast(data[field])
+                except ValueError:
+                    pass  # Left as text so validate_dog_data reports it
+        yield row_number, data, None
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_ndjson(rows):
+    """Encode dog rows as newline-delimited JSON, one chunk per row"""
+    for row in rows:
+        yield json.dumps({field: _export_value(row[field]) for field in DOG_FIELDS}) + "\n"
+
+
+def export_csv(rows):
+    """Encode dog rows as CSV with a header, one chunk per row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(DOG_FIELDS)
+    for row in rows:
+        writer.writerow([_export_value(row[field]) for field in DOG_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
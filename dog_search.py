@@ -0,0 +1,123 @@
+import logging
+import re
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Free-text columns covered by search, most relevant first; the weights rank a
+# match in personality above one buried in the medical history
+SEARCH_FIELDS = ('personality', 'vaccines', 'diseases', 'medical_history')
+SEARCH_WEIGHTS = (4.0, 2.0, 2.0, 1.0)
+POSTGRES_WEIGHT_LABELS = ('A', 'B', 'B', 'C')
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# SQLite: an external-content FTS5 table over dog, kept current by triggers so
+# every write path (single edits, batch statements, imports, replica sync)
+# updates the index in the same transaction as the row
+SQLITE_FTS_COLUMNS = ', '.join(SEARCH_FIELDS)
+SQLITE_NEW_VALUES = ', '.join(f"new.{field}" for field in SEARCH_FIELDS)
+SQLITE_OLD_VALUES = ', '.join(f"old.{field}" for field in SEARCH_FIELDS)
+SQLITE_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS dog_fts USING fts5({SQLITE_FTS_COLUMNS}, "
+    f"content='dog', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS dog_fts_insert AFTER INSERT ON dog BEGIN "
+    f"INSERT INTO dog_fts(rowid, {SQLITE_FTS_COLUMNS}) VALUES (new.id, {SQLITE_NEW_VALUES}); END",
+    f"CREATE TRIGGER IF NOT EXISTS dog_fts_delete AFTER DELETE ON dog BEGIN "
+    f"INSERT INTO dog_fts(dog_fts, rowid, {SQLITE_FTS_COLUMNS}) VALUES ('delete', old.id, {SQLITE_OLD_VALUES}); END",
+    f"CREATE TRIGGER IF NOT EXISTS dog_fts_update AFTER UPDATE OF {SQLITE_FTS_COLUMNS} ON dog BEGIN "
+    f"INSERT INTO dog_fts(dog_fts, rowid, {SQLITE_FTS_COLUMNS}) VALUES ('delete', old.id, {SQLITE_OLD_VALUES}); "
+    f"INSERT INTO dog_fts(rowid, {SQLITE_FTS_COLUMNS}) VALUES (new.id, {SQLITE_NEW_VALUES}); END",
+]
+
+# PostgreSQL: a generated tsvector column, maintained by the server on every
+# write, with a GIN index over it
+POSTGRES_VECTOR = ' || '.join(
+    f"setweight(to_tsvector('english', coalesce({field}, '')), '{label}')"
+    for field, label in zip(SEARCH_FIELDS, POSTGRES_WEIGHT_LABELS)
+)
+POSTGRES_SCHEMA = [
+    f"ALTER TABLE dog ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({POSTGRES_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_dog_search_vector ON dog USING GIN (search_vector)",
+]
+
+
+def install_search_index(engine):
+    """Create the full-text index for the engine's dialect; return False if unsupported"""
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as connection:
+            if dialect == 'sqlite':
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dog_fts'")
+                ).first()
+                for statement in SQLITE_SCHEMA:
+                    connection.execute(text(statement))
+                if not exists:
+                    # Index rows that were already in the table
+                    connection.execute(text("INSERT INTO dog_fts(dog_fts) VALUES ('rebuild')"))
+            elif dialect == 'postgresql':
+                for statement in POSTGRES_SCHEMA:
+                    connection.execute(text(statement))
+            else:
+                logger.warning(f"Full-text search is not supported on {dialect}")
+                return False
+        return True
+    except Exception as e:
+        logger.error(f"Could not create the full-text search index: {str(e)}")
+        return False
+
+
+def drop_search_index(engine):
+    """Drop the SQLite FTS table and its triggers, e.g. before a bulk load
+
+    install_search_index recreates and repopulates it. On PostgreSQL the
+    generated column is left alone since the server maintains it anyway.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as connection:
+        for trigger in ('dog_fts_insert', 'dog_fts_delete', 'dog_fts_update'):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text("DROP TABLE IF EXISTS dog_fts"))
+
+
+def search_terms(query):
+    """Split a search string into lower-case word terms"""
+    return [term.lower() for term in TERM_PATTERN.findall(query)]
+
+
+def search_dogs(session, query, limit=DEFAULT_SEARCH_LIMIT, offset=0):
+    """Return (dog id, score) pairs matching every term of query, best first
+
+    SQLite ranks with FTS5's weighted BM25; PostgreSQL has no BM25, so it
+    uses ts_rank_cd over the weighted tsvector instead. Higher scores are better.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if session.get_bind().dialect.name == 'postgresql':
+        statement = text(
+            "SELECT id, ts_rank_cd(search_vector, query) AS score "
+            "FROM dog, plainto_tsquery('english', :query) AS query "
+            "WHERE search_vector @@ query "
+            "ORDER BY score DESC, id LIMIT :limit OFFSET :offset"
+        )
+        params = {"query": ' '.join(terms)}
+    else:
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+        # bm25() is lower-is-better, so it is negated into a score
+        statement = text(
+            f"SELECT rowid AS id, -bm25(dog_fts, {weights}) AS score "
+            f"FROM dog_fts WHERE dog_fts MATCH :query "
+            f"ORDER BY score DESC, id LIMIT :limit OFFSET :offset"
+        )
+        # Quoting each term keeps FTS5 operators in user input from being parsed
+        params = {"query": ' '.join(f'"{term}"' for term in terms)}
+
+    rows = session.execute(statement, {**params, "limit": limit, "offset": offset})
+    return [(row.id, float(row.score)) for row in rows]
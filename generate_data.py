@@ -0,0 +1,300 @@
+"""Synthetic data generator for the User and Dog tables
+
+Generates large, realistic catalogs for benchmarking. Breeds and colors follow
+skewed (Zipf-like) popularity, heights and weights depend on breed size, and
+the free-text columns are assembled from phrase lists to realistic lengths.
+Rows are produced column-wise in batches and written with executemany: raw
+DBAPI executemany under a bulk-load pragma profile on SQLite, Core
+executemany inserts elsewhere. On SQLite, secondary indexes and the search
+index are dropped for the load and rebuilt once at the end.
+
+Users get real password hashes. Hashing millions of passwords is impractical,
+so --unique-passwords hashes (in parallel) that many distinct passwords and
+user number i gets "password-{i % unique}".
+
+    python generate_data.py --dogs 1000000 --users 100000
+    python generate_data.py --dogs 100000 --database-url sqlite:////tmp/bench.db --seed 7 --reset
+
+The same --seed and starting max(id) always produce the same rows. Generated
+numbers (and so emails) start after the highest existing id rather than the
+row count, so runs after deletes never reuse an email still in the table.
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, func, insert, select, text
+from sqlalchemy.schema import DropIndex
+from werkzeug.security import generate_password_hash
+from dog_search import install_search_index, drop_search_index
+from sync_databases import User, Dog, ensure_indexes, SQLITE_URL
+
+# Popularity-weighted breeds with (height cm, weight kg) ranges
+BREEDS = {
+    'Labrador Retriever': (40, (54, 62), (25, 36)),
+    'German Shepherd': (30, (55, 65), (22, 40)),
+    'Golden Retriever': (26, (51, 61), (25, 34)),
+    'French Bulldog': (22, (28, 33), (8, 14)),
+    'Beagle': (18, (33, 41), (9, 11)),
+    'Poodle': (15, (25, 60), (4, 32)),
+    'Bulldog': (13, (31, 40), (18, 25)),
+    'Rottweiler': (11, (56, 69), (35, 60)),
+    'Dachshund': (10, (20, 27), (7, 15)),
+    'Siberian Husky': (9, (50, 60), (16, 27)),
+    'Boxer': (8, (53, 63), (25, 32)),
+    'Shih Tzu': (7, (20, 28), (4, 7)),
+    'Pug': (6, (25, 33), (6, 9)),
+    'Border Collie': (5, (46, 56), (12, 20)),
+    'Chihuahua': (5, (15, 23), (1, 3)),
+    'Great Dane': (3, (71, 86), (50, 82)),
+    'Mixed Breed': (35, (25, 65), (5, 35)),
+}
+BREED_NAMES = tuple(BREEDS)
+BREED_WEIGHTS = tuple(itertools.accumulate(weight for weight, _, _ in BREEDS.values()))
+
+COLORS = ('Black', 'Brown', 'Golden', 'White', 'Cream', 'Gray', 'Brindle', 'Red', 'Tricolor', 'Merle')
+COLOR_WEIGHTS = tuple(itertools.accumulate((30, 25, 14, 9, 7, 5, 4, 3, 2, 1)))
+
+# Shelters see more young dogs than old ones; 0 is rejected by validation
+AGES = tuple(range(1, 17))
+AGE_WEIGHTS = tuple(itertools.accumulate(max(1, 20 - 2 * age) for age in AGES))
+
+DOG_NAMES = ('Max', 'Bella', 'Charlie', 'Luna', 'Cooper', 'Daisy', 'Buddy', 'Lucy', 'Rocky', 'Molly', 'Bear',
+             'Sadie', 'Duke', 'Maggie', 'Tucker', 'Bailey', 'Jack', 'Stella', 'Milo', 'Zoe', 'Oliver', 'Penny',
+             'Toby', 'Coco', 'Leo', 'Rosie', 'Zeus', 'Ruby', 'Bentley', 'Nala', 'Winston', 'Lola', 'Murphy',
+             'Pepper', 'Bruno', 'Willow', 'Oscar', 'Gracie', 'Finn', 'Hazel')
+
+PERSONALITY_PHRASES = (
+    'Good with kids and very patient.', 'Calm indoors, loves long walks.', 'Energetic and playful, needs a yard.',
+    'Shy at first but loyal once settled.', 'Friendly with other dogs.', 'Gets along with cats.',
+    'House trained and crate trained.', 'Knows sit, stay and come.', 'Affectionate and loves to cuddle.',
+    'Independent; best as an only pet.', 'Smart and eager to please.', 'Quiet, suited to apartment living.',
+    'Protective of family, needs an experienced owner.', 'Loves toys and fetch.', 'Gentle with seniors.',
+)
+VACCINES = ('Rabies', 'DHPP', 'Bordetella', 'Leptospirosis', 'Canine Influenza', 'Lyme')
+DISEASES = ('Allergies', 'Hip dysplasia', 'Ear infection (treated)', 'Parvo (recovered)', 'Heartworm (treated)',
+            'Arthritis', 'Skin condition', 'Dental disease')
+MEDICAL_EVENTS = ('Spayed/neutered in {year}.', 'Microchipped in {year}.', 'Dental cleaning in {year}.',
+                  'Treated for fleas in {year}.', 'X-rays clear in {year}.', 'Minor surgery in {year}.',
+                  'Annual checkup passed in {year}.', 'Blood panel normal in {year}.')
+
+FIRST_NAMES = ('James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'Aisha', 'Wei', 'Priya', 'Carlos', 'Fatima', 'Hiroshi', 'Olga', 'Kwame', 'Sofia', 'Mateo')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Khan', 'Chen', 'Patel', 'Silva', 'Okafor', 'Tanaka', 'Ivanova', 'Mensah', 'Rossi', 'Lopez')
+EMAIL_DOMAINS = ('example.com', 'mail.test', 'inbox.test')
+USER_TYPES = ('customer', 'expert')
+USER_TYPE_WEIGHTS = (97, 100)
+
+DOG_COLUMNS = ('name', 'breed', 'age', 'color', 'height', 'weight', 'gender', 'vaccines', 'diseases',
+               'medical_history', 'personality', 'created_at', 'updated_at')
+USER_COLUMNS = ('name', 'email', 'password', 'type', 'created_at', 'updated_at')
+
+# Pool sizes for precomputed text and timestamps; rows sample from the pools
+POOL_SIZE = 4096
+CREATED_SPAN = timedelta(days=3 * 365)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'  # How SQLAlchemy stores DateTime on SQLite
+
+# Speed over durability: the database is disposable until the load finishes
+BULK_LOAD_PRAGMAS = (
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',
+    'PRAGMA locking_mode = EXCLUSIVE',
+)
+
+
+def personality_text(rng):
+    return ' '.join(rng.sample(PERSONALITY_PHRASES, rng.randint(1, 3)))
+
+
+def vaccines_text(rng):
+    return ', '.join(rng.sample(VACCINES, rng.choices((0, 1, 2, 3, 4), (10, 15, 30, 30, 15))[0]))
+
+
+def diseases_text(rng):
+    return ', '.join(rng.sample(DISEASES, rng.choices((0, 1, 2), (70, 25, 5))[0]))
+
+
+def medical_history_text(rng):
+    events = rng.sample(MEDICAL_EVENTS, rng.randint(0, 4))
+    return ' '.join(event.format(year=rng.randint(2018, 2025)) for event in events)
+
+
+def timestamp_pool(rng, now):
+    return sorted((now - CREATED_SPAN * rng.random()).strftime(TIMESTAMP_FORMAT) for _ in range(POOL_SIZE))
+
+
+def generate_dogs(seed, count, start=0, batch_size=50000):
+    """Yield lists of dog tuples in DOG_COLUMNS order, batch_size rows at a time"""
+    rng = random.Random(f"dogs-{seed}-{start}")
+    now = datetime(2025, 1, 1)
+    pools = {
+        'vaccines': [vaccines_text(rng) for _ in range(POOL_SIZE)],
+        'diseases': [diseases_text(rng) for _ in range(POOL_SIZE)],
+        'medical_history': [medical_history_text(rng) for _ in range(POOL_SIZE)],
+        'personality': [personality_text(rng) for _ in range(POOL_SIZE)],
+        'created_at': timestamp_pool(rng, now),
+    }
+    # Plausible (height, weight) pairs per breed
+    sizes = {
+        breed: [(round(rng.uniform(*height), 1), round(rng.uniform(*weight), 1)) for _ in range(256)]
+        for breed, (_, height, weight) in BREEDS.items()
+    }
+
+    remaining = count
+    while remaining > 0:
+        n = min(batch_size, remaining)
+        remaining -= n
+        breeds = rng.choices(BREED_NAMES, cum_weights=BREED_WEIGHTS, k=n)
+        measurements = [rng.choice(sizes[breed]) for breed in breeds]
+        created = rng.choices(pools['created_at'], k=n)
+        yield list(zip(
+            rng.choices(DOG_NAMES, k=n),
+            breeds,
+            rng.choices(AGES, cum_weights=AGE_WEIGHTS, k=n),
+            rng.choices(COLORS, cum_weights=COLOR_WEIGHTS, k=n),
+            [height for height, _ in measurements],
+            [weight for _, weight in measurements],
+            rng.choices(('Male', 'Female'), k=n),
+            rng.choices(pools['vaccines'], k=n),
+            rng.choices(pools['diseases'], k=n),
+            rng.choices(pools['medical_history'], k=n),
+            rng.choices(pools['personality'], k=n),
+            created,
+            created,
+        ))
+
+
+def hash_passwords(count, method, workers):
+    """Hash password-0 .. password-{count-1} on a process pool"""
+    passwords = [f"password-{i}" for i in range(count)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(generate_password_hash, passwords, itertools.repeat(method),
+                             chunksize=max(1, count // (workers * 4))))
+
+
+def generate_users(seed, count, hashes, start=0, batch_size=50000):
+    """Yield lists of user tuples in USER_COLUMNS order; user i gets hashes[i % len(hashes)]"""
+    rng = random.Random(f"users-{seed}-{start}")
+    created_pool = timestamp_pool(rng, datetime(2025, 1, 1))
+    for batch_start in range(start, start + count, batch_size):
+        numbers = range(batch_start, min(batch_start + batch_size, start + count))
+        n = len(numbers)
+        firsts = rng.choices(FIRST_NAMES, k=n)
+        lasts = rng.choices(LAST_NAMES, k=n)
+        domains = rng.choices(EMAIL_DOMAINS, k=n)
+        created = rng.choices(created_pool, k=n)
+        yield [
+            (f"{first} {last}", f"{first.lower()}.{last.lower()}.{number}@{domain}",
+             hashes[number % len(hashes)], user_type, stamp, stamp)
+            for number, first, last, domain, user_type, stamp in zip(
+                numbers, firsts, lasts, domains,
+                rng.choices(USER_TYPES, cum_weights=USER_TYPE_WEIGHTS, k=n), created)
+        ]
+
+
+def apply_bulk_load_profile(engine):
+    """Run BULK_LOAD_PRAGMAS on every new SQLite connection of the engine"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in BULK_LOAD_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def bulk_insert(engine, table, columns, batches):
+    """Insert every batch, committing each; returns rows written"""
+    written = 0
+    if engine.dialect.name == 'sqlite':
+        statement = f"INSERT INTO \"{table.name}\" ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for batch in batches:
+                cursor.executemany(statement, batch)
+                connection.commit()
+                written += len(batch)
+        finally:
+            connection.close()
+    else:
+        with engine.connect() as connection:
+            for batch in batches:
+                connection.execute(insert(table), [dict(zip(columns, row)) for row in batch])
+                connection.commit()
+                written += len(batch)
+    return written
+
+
+def drop_secondary_indexes(engine):
+    with engine.begin() as connection:
+        for table in (User.__table__, Dog.__table__):
+            for index in table.indexes:
+                connection.execute(DropIndex(index, if_exists=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic users and dogs")
+    parser.add_argument('--dogs', type=int, default=0, help='Dogs to add')
+    parser.add_argument('--users', type=int, default=0, help='Users to add')
+    parser.add_argument('--database-url', default=SQLITE_URL)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--reset', action='store_true', help='Delete existing users and dogs first')
+    parser.add_argument('--unique-passwords', type=int, default=256, help='Distinct password hashes to compute')
+    parser.add_argument('--hash-method', default=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Processes used for hashing')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    sqlite = engine.dialect.name == 'sqlite'
+    if sqlite:
+        os.makedirs('instance', exist_ok=True)
+        apply_bulk_load_profile(engine)
+
+    User.metadata.create_all(engine, tables=[User.__table__, Dog.__table__])
+    if sqlite:
+        # Maintaining indexes row by row is most of the cost; rebuild them once instead
+        drop_secondary_indexes(engine)
+        drop_search_index(engine)
+
+    try:
+        with engine.begin() as connection:
+            if args.reset:
+                connection.execute(text('DELETE FROM dog'))
+                connection.execute(text('DELETE FROM "user"'))
+            # Bulk-inserted rows get ids above the current maximum, so user number
+            # i lands on id i + 1 and every existing generated email has a lower number
+            dog_start = connection.scalar(select(func.coalesce(func.max(Dog.__table__.c.id), 0)))
+            user_start = connection.scalar(select(func.coalesce(func.max(User.__table__.c.id), 0)))
+
+        if args.users:
+            start = time.perf_counter()
+            hashes = hash_passwords(min(args.unique_passwords, args.users), args.hash_method, args.workers)
+            print(f"Hashed {len(hashes)} passwords in {time.perf_counter() - start:.1f}s")
+            start = time.perf_counter()
+            written = bulk_insert(engine, User.__table__, USER_COLUMNS,
+                                  generate_users(args.seed, args.users, hashes, user_start, args.batch_size))
+            elapsed = time.perf_counter() - start
+            print(f"Inserted {written} users in {elapsed:.1f}s ({written / elapsed:,.0f} rows/sec)")
+
+        if args.dogs:
+            start = time.perf_counter()
+            written = bulk_insert(engine, Dog.__table__, DOG_COLUMNS,
+                                  generate_dogs(args.seed, args.dogs, dog_start, args.batch_size))
+            elapsed = time.perf_counter() - start
+            print(f"Inserted {written} dogs in {elapsed:.1f}s ({written / elapsed:,.0f} rows/sec)")
+    finally:
+        start = time.perf_counter()
+        ensure_indexes(engine)
+        install_search_index(engine)
+        print(f"Rebuilt indexes in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
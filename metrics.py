@@ -0,0 +1,230 @@
+"""Request instrumentation exported in the Prometheus text format
+
+Every thread records into its own shard of plain dicts, so the request path
+takes no locks; a scrape of /metrics sums the shards. When a thread exits its
+shard is folded into a shared "retired" shard, so servers that start a thread
+per request do not accumulate shards. Recorded per route template: request
+counts by status, a latency histogram, requests in flight and database query
+count/time. Upstream calls (the chat API) get their own
+latency histogram.
+"""
+import bisect
+import threading
+import time
+import weakref
+from flask import g, request, has_request_context
+from flask.signals import request_started, request_finished
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Quantiles estimated from the histograms for quick reading without PromQL
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+SHARD_FIELDS = ('requests', 'latency', 'in_flight', 'db_queries', 'db_seconds', 'upstream')
+
+
+class _Shard:
+    """Metrics written only by the thread that owns them"""
+
+    def __init__(self):
+        self.requests = {}  # (route, method, status) -> count
+        self.latency = {}  # (route, method) -> [count per bucket..., +Inf, sum]
+        self.in_flight = {}  # route -> started minus finished
+        self.db_queries = {}  # route -> queries
+        self.db_seconds = {}  # route -> seconds
+        self.upstream = {}  # (service, outcome) -> [count per bucket..., +Inf, sum]
+
+
+class _ThreadAlive:
+    """Held in thread-local storage only; it is collected when its thread exits"""
+
+
+def _add_into(merged, table):
+    # Copying the items is atomic under the GIL even while the owner writes
+    for key, value in list(table.items()):
+        if isinstance(value, list):
+            total = merged.setdefault(key, [0] * len(value))
+            merged[key] = [a + b for a, b in zip(total, value)]
+        else:
+            merged[key] = merged.get(key, 0) + value
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_label(value)}"' for name, value in zip(names, values))
+
+
+def _estimate_quantile(quantile, buckets, counts):
+    """Interpolate a quantile from non-cumulative bucket counts, like histogram_quantile()"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = quantile * total
+    seen = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if count and seen + count >= rank:
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+    return buckets[-1]
+
+
+class RequestMetrics:
+    """Per-route request metrics for a Flask app, rendered for Prometheus"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()  # Totals of threads that have exited
+        # Guards the list of shards and the retired totals; reentrant because a
+        # retirement can run from garbage collection in a thread already holding it
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        app.teardown_request(self._request_teardown)
+        event.listen(Engine, 'before_cursor_execute', self._before_query)
+        event.listen(Engine, 'after_cursor_execute', self._after_query)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            self._local.alive = _ThreadAlive()
+            with self._lock:
+                self._shards.append(shard)
+            weakref.finalize(self._local.alive, self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        """Fold the shard of an exited thread into the retired totals"""
+        with self._lock:
+            self._shards.remove(shard)
+            for name in SHARD_FIELDS:
+                _add_into(getattr(self._retired, name), getattr(shard, name))
+
+    def _observe(self, table, key, seconds):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, seconds)] += 1
+        entry[-1] += seconds
+
+    def _request_started(self, sender, **extra):
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g.metrics = {"route": route, "start": time.perf_counter(), "queries": 0, "db_seconds": 0.0}
+        in_flight = self._shard().in_flight
+        in_flight[route] = in_flight.get(route, 0) + 1
+
+    def _request_finished(self, sender, response, **extra):
+        state = g.get('metrics')
+        if state is None:
+            return
+        # Streamed bodies are still being sent; this measures time to the first byte
+        shard = self._shard()
+        route = state["route"]
+        key = (route, request.method, response.status_code)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        self._observe(shard.latency, (route, request.method), time.perf_counter() - state["start"])
+
+    def _request_teardown(self, error):
+        state = g.pop('metrics', None)
+        if state is None:
+            return
+        shard = self._shard()
+        route = state["route"]
+        shard.in_flight[route] = shard.in_flight.get(route, 0) - 1
+        shard.db_queries[route] = shard.db_queries.get(route, 0) + state["queries"]
+        shard.db_seconds[route] = shard.db_seconds.get(route, 0.0) + state["db_seconds"]
+
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_query(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        if has_request_context():
+            state = g.get('metrics')
+            if state is not None:
+                state["queries"] += 1
+                state["db_seconds"] += elapsed
+
+    def observe_upstream(self, service, seconds, outcome='ok'):
+        """Record the duration of a call to an upstream service"""
+        self._observe(self._shard().upstream, (service, outcome), seconds)
+
+    def _merge(self, name):
+        merged = {}
+        # Held throughout so a shard retiring mid-scrape is not counted twice
+        with self._lock:
+            for shard in self._shards + [self._retired]:
+                _add_into(merged, getattr(shard, name))
+        return merged
+
+    def _render_histogram(self, lines, name, label_names, histograms):
+        for key, entry in sorted(histograms.items()):
+            labels = _labels(label_names, key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += entry[len(self.buckets)]
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {entry[-1]:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+
+        lines.append('# HELP http_requests_total Requests completed, by route template, method and status code.')
+        lines.append('# TYPE http_requests_total counter')
+        for key, count in sorted(self._merge('requests').items()):
+            lines.append(f'http_requests_total{{{_labels(("route", "method", "status"), key)}}} {count}')
+
+        latency = self._merge('latency')
+        lines.append('# HELP http_request_duration_seconds Time from request start to response headers.')
+        lines.append('# TYPE http_request_duration_seconds histogram')
+        self._render_histogram(lines, 'http_request_duration_seconds', ('route', 'method'), latency)
+
+        lines.append('# HELP http_request_duration_quantile_seconds Latency quantiles estimated from the histogram.')
+        lines.append('# TYPE http_request_duration_quantile_seconds gauge')
+        for key, entry in sorted(latency.items()):
+            for quantile in QUANTILES:
+                value = _estimate_quantile(quantile, self.buckets, entry[:len(self.buckets) + 1])
+                if value is not None:
+                    labels = _labels(('route', 'method', 'quantile'), key + (quantile,))
+                    lines.append(f'http_request_duration_quantile_seconds{{{labels}}} {value:.6f}')
+
+        lines.append('# HELP http_requests_in_flight Requests currently being handled.')
+        lines.append('# TYPE http_requests_in_flight gauge')
+        for route, count in sorted(self._merge('in_flight').items()):
+            lines.append(f'http_requests_in_flight{{{_labels(("route",), (route,))}}} {count}')
+
+        lines.append('# HELP http_request_db_queries_total Database queries issued while handling requests.')
+        lines.append('# TYPE http_request_db_queries_total counter')
+        for route, count in sorted(self._merge('db_queries').items()):
+            lines.append(f'http_request_db_queries_total{{{_labels(("route",), (route,))}}} {count}')
+
+        lines.append('# HELP http_request_db_seconds_total Time spent in database queries while handling requests.')
+        lines.append('# TYPE http_request_db_seconds_total counter')
+        for route, seconds in sorted(self._merge('db_seconds').items()):
+            lines.append(f'http_request_db_seconds_total{{{_labels(("route",), (route,))}}} {seconds:.6f}')
+
+        lines.append('# HELP upstream_request_duration_seconds Duration of calls to upstream services.')
+        lines.append('# TYPE upstream_request_duration_seconds histogram')
+        self._render_histogram(lines, 'upstream_request_duration_seconds', ('service', 'outcome'), self._merge('upstream'))
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingUnavailable(Exception):
+    """Raised when the hashing pool is saturated or a hash takes too long"""
+
+
+class PasswordHasher:
+    """Runs password hashing on a dedicated, size-limited process pool
+
+    At most `workers` hashes run at once and `queue_size` more may wait; any
+    request beyond that fails fast with HashingUnavailable instead of tying up
+    a web worker. Set workers to 0 to hash inline in the calling thread.
+    """
+
+    def __init__(self, method='scrypt', workers=2, queue_size=32, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._prefix = None
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _reset_executor(self):
+        with self._executor_lock:
+            self._executor = None
+
+    def _run(self, fn, *args):
+        if self.workers == 0:
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            raise HashingUnavailable("Password hashing queue is full")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_executor()
+            raise HashingUnavailable("Password hashing pool restarted")
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the pool has actually finished the job
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HashingUnavailable("Password hashing timed out")
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise HashingUnavailable("Password hashing pool restarted")
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Check whether a stored hash was made with different parameters"""
+        if self._prefix is None:
+            # Werkzeug expands defaults into the prefix, e.g. scrypt -> scrypt:32768:8:1;
+            # learning it costs a full hash, so it runs on the pool like any other
+            self._prefix = self._run(generate_password_hash, '', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
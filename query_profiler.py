@@ -0,0 +1,140 @@
+"""Opt-in SQL profiling built on SQLAlchemy engine events
+
+For every statement the profiler records the SQL text, the shape of its
+parameters (types and counts, never values), its duration, the route being
+served and the line of app code that issued it. Queries slower than a
+threshold are logged as they finish. At the end of each request, statements
+repeated at least `n_plus_one` times are reported as likely N+1 patterns.
+Per-request reports go into X-Query-* response headers and into a bounded
+history served by the admin debug endpoint.
+"""
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+def parameter_shape(parameters, executemany):
+    """Describe bound parameters by name and type without exposing their values"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameter_shape(parameters[0], False) if parameters else None
+        return {"rows": len(parameters), "row": first}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class QueryProfiler:
+    """Collects per-request query reports for a Flask app"""
+
+    def __init__(self, slow_query_ms=100, n_plus_one=5, history=50):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one = n_plus_one
+        self.reports = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.root = None
+
+    def init_app(self, app):
+        self.root = app.root_path
+        app.before_request(self._start_request)
+        app.after_request(self._add_headers)
+        app.teardown_request(self._finish_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_query)
+        event.listen(Engine, 'after_cursor_execute', self._after_query)
+
+    def _caller(self):
+        """Return file:line of the innermost app frame that led to the query"""
+        frame = sys._getframe(3)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(self.root) and filename != __file__ and 'site-packages' not in filename:
+                return f"{os.path.basename(filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+            frame = frame.f_back
+        return None
+
+    def _start_request(self):
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        g.query_profile = {"route": route, "method": request.method, "queries": []}
+
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_query_start', []).append(time.perf_counter())
+
+    def _after_query(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('profiler_query_start')
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        profile = g.get('query_profile') if has_request_context() else None
+        route = profile["route"] if profile is not None else None
+
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(f"Slow query ({elapsed_ms:.1f} ms) on {route or 'background work'}: "
+                           f"{' '.join(statement.split())[:500]} params={parameter_shape(parameters, executemany)}")
+        if profile is not None:
+            profile["queries"].append({
+                "statement": statement,
+                "parameters": parameter_shape(parameters, executemany),
+                "duration_ms": round(elapsed_ms, 3),
+                "caller": self._caller(),
+            })
+
+    def _summarize(self, profile):
+        queries = profile["queries"]
+        repeats = Counter(query["statement"] for query in queries)
+        suspects = []
+        for statement, count in repeats.most_common():
+            if count < self.n_plus_one:
+                break
+            callers = sorted({query["caller"] for query in queries if query["statement"] == statement and query["caller"]})
+            suspects.append({"statement": statement, "count": count, "callers": callers})
+        return {
+            "route": profile["route"],
+            "method": profile["method"],
+            "query_count": len(queries),
+            "total_ms": round(sum(query["duration_ms"] for query in queries), 3),
+            "n_plus_one": suspects,
+            "queries": queries,
+        }
+
+    def _add_headers(self, response):
+        profile = g.get('query_profile')
+        if profile is not None:
+            profile["id"] = next(self._ids)
+            summary = self._summarize(profile)
+            response.headers["X-Query-Report"] = str(profile["id"])
+            response.headers["X-Query-Count"] = str(summary["query_count"])
+            response.headers["X-Query-Time-Ms"] = f"{summary['total_ms']:.1f}"
+            if summary["n_plus_one"]:
+                response.headers["X-Query-N-Plus-One"] = str(len(summary["n_plus_one"]))
+        return response
+
+    def _finish_request(self, error):
+        profile = g.pop('query_profile', None)
+        if profile is None:
+            return
+        # Summarized again here so queries issued while streaming the body are included
+        report = {"id": profile.get("id"), **self._summarize(profile)}
+        for suspect in report["n_plus_one"]:
+            logger.warning(f"Possible N+1 on {report['route']}: {suspect['count']}x "
+                           f"{' '.join(suspect['statement'].split())[:300]} from {', '.join(suspect['callers']) or 'unknown'}")
+        with self._lock:
+            self.reports.append(report)
+
+    def recent(self, report_id=None):
+        """Return stored reports, newest first, or the one with report_id"""
+        with self._lock:
+            reports = list(self.reports)
+        if report_id is not None:
+            return [report for report in reports if report["id"] == report_id]
+        return reports[::-1]
@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify
+
+RATE_UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+RATE_PATTERN = re.compile(r'(\d+)\s*(?:per|/)\s*(\d+)?\s*(second|minute|hour|day)s?')
+
+
+def parse_rate_limit(spec):
+    """Parse '100 per day', '10/minute' or '5 per 10 seconds' into (count, seconds) pairs
+
+    Several limits can be combined with ';', e.g. '10 per minute; 100 per day'.
+    """
+    limits = []
+    for part in spec.split(';'):
+        part = part.strip().lower()
+        if not part:
+            continue
+        match = RATE_PATTERN.fullmatch(part)
+        if not match:
+            raise ValueError(f"Invalid rate limit: {part}")
+        count, multiplier, unit = match.groups()
+        limits.append((int(count), int(multiplier or 1) * RATE_UNITS[unit]))
+    return limits
+
+
+class RateLimiter:
+    """In-memory token-bucket rate limiter keyed by route and identity
+
+    Each (route, identity, limit) gets a bucket holding up to `count` tokens that
+    refills at count/period tokens per second, so a check is a dictionary lookup
+    and a little arithmetic. Buckets idle long enough to be full again are
+    dropped by a periodic sweep, and beyond max_buckets the least recently used
+    bucket is dropped, so rotating identities cannot grow the store without bound.
+    """
+
+    def __init__(self, default_limit, sweep_interval=60, max_buckets=100000):
+        self.default_limits = parse_rate_limit(default_limit)
+        self.sweep_interval = sweep_interval
+        self.max_buckets = max_buckets
+        self.allowed = 0
+        self.limited = 0
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at, capacity, refill_rate], least recently used first
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _sweep(self, now):
+        idle = [key for key, (tokens, updated_at, capacity, rate) in self._buckets.items()
+                if tokens + (now - updated_at) * rate >= capacity]
+        for key in idle:
+            del self._buckets[key]
+        self._last_sweep = now
+
+    def hit(self, *checks):
+        """Take one token from every bucket of each (key, limits) check; return seconds to wait, or 0 if allowed"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep > self.sweep_interval:
+                self._sweep(now)
+
+            buckets = []
+            wait = 0.0
+            for key, limits in checks:
+                for count, period in limits:
+                    rate = count / period
+                    bucket_key = (key, count, period)
+                    bucket = self._buckets.get(bucket_key)
+                    if bucket is None:
+                        bucket = self._buckets[bucket_key] = [float(count), now, count, rate]
+                        if len(self._buckets) > self.max_buckets:
+                            self._buckets.popitem(last=False)
+                    else:
+                        bucket[0] = min(count, bucket[0] + (now - bucket[1]) * rate)
+                        bucket[1] = now
+                        self._buckets.move_to_end(bucket_key)
+                    if bucket[0] < 1:
+                        wait = max(wait, (1 - bucket[0]) / rate)
+                    buckets.append(bucket)
+
+            # Only spend tokens when every limit allows the request
+            if wait:
+                self.limited += 1
+                return wait
+            for bucket in buckets:
+                bucket[0] -= 1
+            self.allowed += 1
+            return 0
+
+    def limit(self, spec=None, key=None, key_spec=None):
+        """Decorator enforcing a rate limit on a route
+
+        Use it below token_required so limits apply per user; on public routes
+        the client IP address is used instead. `key` is an optional function
+        returning a second identity for the current request, e.g. the email
+        submitted to a login form; it gets its own limit (key_spec, or spec if
+        not given) on top of the per-user or per-IP one, and a request must pass
+        both. Without a spec the default limit is applied.
+        """
+        limits = parse_rate_limit(spec) if spec else self.default_limits
+        key_limits = parse_rate_limit(key_spec) if key_spec else limits
+
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                user = args[0] if args and hasattr(args[0], 'id') else None
+                identity = f"user:{user.id}" if user is not None else f"ip:{request.remote_addr}"
+                checks = [((f.__name__, identity), limits)]
+                extra = key() if key is not None else None
+                if extra:
+                    checks.append(((f.__name__, f"key:{extra}"), key_limits))
+                wait = self.hit(*checks)
+                if wait:
+                    response = jsonify({"message": "Rate limit exceeded"})
+                    response.status_code = 429
+                    response.headers["Retry-After"] = str(int(wait) + 1)
+                    return response
+                return f(*args, **kwargs)
+            return decorated
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            return {"allowed": self.allowed, "limited": self.limited, "buckets": len(self._buckets)}
@@ -0,0 +1,233 @@
+"""Dog recommendations scored against a customer's preferences
+
+The catalog is kept in memory as column arrays: normalized age/height/weight,
+breed/color/gender category codes (a one-hot encoding stored as the index of
+the hot column) and a 0/1 matrix of personality traits. Scoring every dog is
+a handful of vectorized operations followed by a partial sort for the top k,
+so ranking stays in the low milliseconds for 100k dogs.
+
+Dog writes mark rows dirty; the next request re-encodes only those rows.
+"""
+import re
+import threading
+import time
+from background_rebuild import BackgroundRebuild
+
+try:
+    import numpy as np
+except ImportError:  # Recommendations are disabled without NumPy
+    np = None
+
+# Validation bounds from validate_dog_data, so normalization never changes as dogs are added
+NUMERIC_FIELDS = ('age', 'height', 'weight')
+NUMERIC_RANGES = np.array([30.0, 200.0, 100.0], dtype=np.float32) if np is not None else None
+
+CATEGORY_FIELDS = ('breed', 'color', 'gender')
+
+# Personality traits and the words in free text that signal them
+TRAITS = {
+    'kids': {'kid', 'kids', 'child', 'children', 'family', 'families'},
+    'cats': {'cat', 'cats'},
+    'dogs': {'dog', 'dogs'},
+    'calm': {'calm', 'relaxed', 'mellow', 'quiet', 'gentle'},
+    'energetic': {'energetic', 'active', 'athletic', 'runner', 'hyper'},
+    'playful': {'playful', 'fun', 'toys', 'play'},
+    'friendly': {'friendly', 'social', 'sociable', 'outgoing'},
+    'affectionate': {'affectionate', 'cuddly', 'loving', 'sweet'},
+    'loyal': {'loyal', 'devoted', 'protective'},
+    'trained': {'trained', 'housetrained', 'obedient', 'housebroken'},
+    'independent': {'independent'},
+    'shy': {'shy', 'timid', 'nervous', 'anxious'},
+    'apartment': {'apartment', 'flat', 'small'},
+    'smart': {'smart', 'intelligent', 'clever'},
+}
+TRAIT_NAMES = tuple(TRAITS)
+TRAIT_WORDS = {word: index for index, trait in enumerate(TRAIT_NAMES) for word in TRAITS[trait]}
+
+WORD_PATTERN = re.compile(r'[a-z]+')
+
+# Relative weight of each kind of preference in the score
+NUMERIC_WEIGHT = 1.0
+CATEGORY_WEIGHT = 2.0
+TRAIT_WEIGHT = 3.0
+
+
+def trait_vector(text):
+    """Return the indexes of the traits mentioned in free text"""
+    return sorted({TRAIT_WORDS[word] for word in WORD_PATTERN.findall((text or '').lower()) if word in TRAIT_WORDS})
+
+
+class DogRecommender:
+    """In-memory feature matrix of the dog catalog with vectorized scoring
+
+    `loader(ids)` returns dog rows (all of them when ids is None). The matrix is
+    built lazily, patched for rows marked changed or deleted, and rebuilt from
+    scratch by a BackgroundRebuild after `max_age` seconds to pick up writes
+    made by other processes.
+    """
+
+    def __init__(self, loader, max_age=300):
+        if np is None:
+            raise RuntimeError("NumPy is required for recommendations")
+        self.loader = loader
+        self.max_age = max_age
+        self.patched_rows = 0
+        self._dirty = set()
+        self._deleted = set()
+        self._lock = threading.Lock()
+        self._rebuild = BackgroundRebuild("recommender", self._lock, self._load, DogRecommender._note, self._swap, max_age)
+        self._reset(0)
+
+    def _reset(self, capacity):
+        self.size = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.numeric = np.zeros((capacity, len(NUMERIC_FIELDS)), dtype=np.float32)
+        self.categories = np.full((capacity, len(CATEGORY_FIELDS)), -1, dtype=np.int32)
+        self.traits = np.zeros((capacity, len(TRAIT_NAMES)), dtype=np.float32)
+        self.rows = {}  # dog id -> row index
+        self.vocabularies = [{} for _ in CATEGORY_FIELDS]  # value -> category code
+
+    def _grow(self, needed):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 64)
+        for name in ('ids', 'alive', 'numeric', 'categories', 'traits'):
+            old = getattr(self, name)
+            fill = -1 if name == 'categories' else 0
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _code(self, field_index, value):
+        if value is None:
+            return -1
+        vocabulary = self.vocabularies[field_index]
+        key = str(value).strip().lower()
+        if key not in vocabulary:
+            vocabulary[key] = len(vocabulary)
+        return vocabulary[key]
+
+    def _encode(self, row, dog):
+        self.ids[row] = dog.id
+        self.alive[row] = True
+        values = [getattr(dog, field) for field in NUMERIC_FIELDS]
+        self.numeric[row] = [np.nan if value is None else value for value in values]
+        self.numeric[row] /= NUMERIC_RANGES
+        self.categories[row] = [self._code(i, getattr(dog, field)) for i, field in enumerate(CATEGORY_FIELDS)]
+        self.traits[row] = 0
+        self.traits[row, trait_vector(dog.personality)] = 1
+
+    def _upsert(self, dogs):
+        for dog in dogs:
+            row = self.rows.get(dog.id)
+            if row is None:
+                self._grow(self.size + 1)
+                row = self.rows[dog.id] = self.size
+                self.size += 1
+            self._encode(row, dog)
+            self.patched_rows += 1
+
+    def _remove(self, ids):
+        for dog_id in ids:
+            row = self.rows.pop(dog_id, None)
+            if row is not None:
+                self.alive[row] = False
+
+    def _load(self):
+        """Return a new DogRecommender holding the matrix of every dog from the loader"""
+        fresh = DogRecommender(self.loader, self.max_age)
+        dogs = list(self.loader(None))
+        fresh._reset(len(dogs))
+        for row, dog in enumerate(dogs):
+            fresh.rows[dog.id] = row
+            fresh._encode(row, dog)
+        fresh.size = len(dogs)
+        return fresh
+
+    def _swap(self, fresh):
+        for name in ('size', 'ids', 'alive', 'numeric', 'categories', 'traits', 'rows', 'vocabularies', '_dirty', '_deleted'):
+            setattr(self, name, getattr(fresh, name))
+
+    def _refresh(self):
+        # Also rebuild when deleted rows make up most of the matrix
+        self._rebuild.refresh(force=self.size > 64 and len(self.rows) < self.size // 2)
+        if self._deleted:
+            self._remove(self._deleted)
+            self._deleted.clear()
+        if self._dirty:
+            dirty, self._dirty = list(self._dirty), set()
+            self._upsert(self.loader(dirty))
+
+    def _note(self, kind, ids, fields):
+        """Mark the rows a change touches; return False when only a rebuild can account for it"""
+        if kind == 'reload' or ids is None:
+            return False
+        if kind == 'delete':
+            self._deleted.update(ids)
+            self._dirty.difference_update(ids)
+        else:
+            self._dirty.update(ids)
+        return True
+
+    def on_dog_change(self, kind, ids, fields):
+        """DogChangeHub listener: note what changed for the next refresh"""
+        with self._lock:
+            self._rebuild.record(kind, ids, fields)
+            if not self._note(kind, ids, fields):
+                self._rebuild.expired = True
+
+    def recommend(self, preferences, limit=10):
+        """Return up to limit (dog id, score) pairs, best first
+
+        preferences may hold numeric targets (age, height, weight), lists of
+        acceptable breeds, colors or genders, and free text describing the
+        personality wanted.
+        """
+        with self._lock:
+            self._refresh()
+            size = self.size
+            scores = np.zeros(size, dtype=np.float32)
+
+            for i, field in enumerate(NUMERIC_FIELDS):
+                target = preferences.get(field)
+                if target is not None:
+                    distance = np.abs(self.numeric[:size, i] - np.float32(target / NUMERIC_RANGES[i]))
+                    scores -= NUMERIC_WEIGHT * np.nan_to_num(distance, nan=1.0)
+
+            for i, field in enumerate(CATEGORY_FIELDS):
+                wanted = preferences.get(field)
+                if wanted:
+                    vocabulary = self.vocabularies[i]
+                    codes = [vocabulary[value.strip().lower()] for value in wanted if value.strip().lower() in vocabulary]
+                    scores += CATEGORY_WEIGHT * np.isin(self.categories[:size, i], codes)
+
+            wanted_traits = trait_vector(preferences.get('personality'))
+            if wanted_traits:
+                weights = np.zeros(len(TRAIT_NAMES), dtype=np.float32)
+                weights[wanted_traits] = TRAIT_WEIGHT / len(wanted_traits)
+                scores += self.traits[:size] @ weights
+
+            scores[~self.alive[:size]] = -np.inf
+            ids = self.ids[:size].copy()
+            limit = min(limit, len(self.rows))
+
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(ids[row]), float(scores[row])) for row in top]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "dogs": len(self.rows),
+                "rows": self.size,
+                "pending_changes": len(self._dirty) + len(self._deleted),
+                "rebuilds": self._rebuild.rebuilds,
+                "rebuilding": self._rebuild.running,
+                "patched_rows": self.patched_rows,
+                "age_seconds": round(time.monotonic() - self._rebuild.built_at, 1) if self._rebuild.built_at else None,
+                "traits": list(TRAIT_NAMES),
+            }
@@ -0,0 +1,62 @@
+"""Connection settings for the SQLite databases (the local database and the replica)
+
+Every new connection gets the same pragmas through an engine connect event:
+
+- WAL journal, so readers keep reading the last committed state while a sync
+  or refresh transaction writes, and the writer never waits for readers;
+- synchronous=NORMAL, which is durable against crashes of the process in WAL
+  mode and skips an fsync per commit;
+- memory-mapped reads, a larger page cache and in-memory temp tables;
+- a busy timeout, so a second writer waits its turn instead of failing with
+  "database is locked".
+
+The pool holds one connection per request thread plus overflow for the sync
+and catch-up threads.
+"""
+import os
+from sqlalchemy import create_engine, event
+
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # Bytes of the file mapped into memory
+SQLITE_CACHE_KB = int(os.getenv('SQLITE_CACHE_KB', 16 * 1024))  # Page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))  # How long a writer waits for the lock
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 10))  # Roughly the number of request threads
+SQLITE_MAX_OVERFLOW = int(os.getenv('SQLITE_MAX_OVERFLOW', 10))
+
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}',
+    f'PRAGMA cache_size = -{SQLITE_CACHE_KB}',
+    f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}',
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+def sqlite_engine_options():
+    """Engine keyword arguments for a file-backed SQLite database"""
+    return {
+        "pool_size": SQLITE_POOL_SIZE,
+        "max_overflow": SQLITE_MAX_OVERFLOW,
+        # Connections are handed between request threads by the pool
+        "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    }
+
+
+def apply_sqlite_profile(engine):
+    """Run SQLITE_PRAGMAS on every new connection of a SQLite engine; other engines are left alone"""
+    if engine.dialect.name != 'sqlite':
+        return engine
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+def create_sqlite_engine(url):
+    """create_engine() with the pool sizing and pragmas above"""
+    return apply_sqlite_profile(create_engine(url, **sqlite_engine_options()))
@@ -0,0 +1,137 @@
+"""Precompressed, fingerprinted static asset serving
+
+At startup every static file in the site root is read once, hashed and
+compressed with gzip (and brotli when the module is installed). Stylesheets,
+scripts and images also get a content-hashed URL such as styles.3f2a9c1b0d.css,
+and references to them inside HTML and CSS are rewritten to that URL so browsers
+can cache them forever. HTML pages keep their normal URLs and are revalidated
+with ETags instead.
+
+Run this module directly to print the asset manifest and compression savings.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+STATIC_EXTENSIONS = {'.html', '.css', '.js', '.svg', '.png', '.jpg', '.jpeg', '.gif',
+                     '.ico', '.avif', '.webp', '.woff', '.woff2'}
+
+# Text formats worth compressing; images are already compressed
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.svg'}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+class StaticAsset:
+    """One static file held in memory with its encoded variants"""
+
+    def __init__(self, name, content, fingerprinted_name=None):
+        self.name = name
+        self.fingerprinted_name = fingerprinted_name
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'image/svg+xml'):
+            self.content_type += '; charset=utf-8'
+        self.digest = hashlib.sha256(content).hexdigest()
+        self.variants = {'identity': content}
+
+        if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                if len(compressed) < len(content):
+                    self.variants['br'] = compressed
+
+
+def fingerprint(name, content):
+    """Insert a short content hash before the extension of a file name"""
+    base, ext = os.path.splitext(name)
+    return f"{base}.{hashlib.sha256(content).hexdigest()[:10]}{ext}"
+
+
+def rewrite_references(text, renames):
+    """Point src/href attributes and CSS url() references at fingerprinted names"""
+    for name, new_name in renames.items():
+        escaped = re.escape(name)
+        text = re.sub(r'((?:src|href)\s*=\s*["\'])(/?)' + escaped + r'(["\'])', r'\g<1>\g<2>' + new_name + r'\g<3>', text)
+        text = re.sub(r'(url\(\s*["\']?)(/?)' + escaped + r'(["\']?\s*\))', r'\g<1>\g<2>' + new_name + r'\g<3>', text)
+    return text
+
+
+class StaticAssets:
+    """Manifest of precomputed static assets for a directory"""
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+
+    def build(self):
+        """Read, fingerprint and compress every static file in the root directory"""
+        files = {}
+        for entry in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, entry)
+            if os.path.isfile(path) and os.path.splitext(entry)[1].lower() in STATIC_EXTENSIONS:
+                with open(path, 'rb') as f:
+                    files[entry] = f.read()
+
+        renames = {}
+        # Binary assets and scripts first, then CSS (which can reference images), then HTML
+        for name in [n for n in files if not n.lower().endswith(('.css', '.html'))]:
+            renames[name] = fingerprint(name, files[name])
+        for name in [n for n in files if n.lower().endswith('.css')]:
+            files[name] = rewrite_references(files[name].decode('utf-8'), renames).encode('utf-8')
+            renames[name] = fingerprint(name, files[name])
+        for name in [n for n in files if n.lower().endswith('.html')]:
+            files[name] = rewrite_references(files[name].decode('utf-8'), renames).encode('utf-8')
+
+        assets = {}
+        for name, content in files.items():
+            asset = StaticAsset(name, content, renames.get(name))
+            assets[name] = asset
+            if asset.fingerprinted_name:
+                assets[asset.fingerprinted_name] = asset
+        self.assets = assets
+        return self
+
+    def response_for(self, path, request, response_class):
+        """Build a negotiated, cacheable response for a path, or None if unknown"""
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        response = response_class(asset.variants[encoding], content_type=asset.content_type)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        # Each encoding has different bytes, so each needs its own strong ETag
+        response.set_etag(f"{asset.digest[:32]}-{encoding}")
+        if path == asset.fingerprinted_name:
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+        return response.make_conditional(request)
+
+
+if __name__ == "__main__":
+    manifest = StaticAssets(os.path.dirname(os.path.abspath(__file__))).build()
+    print(f"{'asset':<40} {'identity':>10} {'gzip':>10} {'br':>10}")
+    for name, asset in sorted(manifest.assets.items()):
+        if name != asset.name:
+            continue
+        sizes = [len(asset.variants[e]) if e in asset.variants else '-' for e in ('identity', 'gzip', 'br')]
+        print(f"{asset.fingerprinted_name or name:<40} {sizes[0]:>10} {sizes[1]:>10} {sizes[2]:>10}")
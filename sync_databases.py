@@ -1,17 +1,31 @@
 import os
 import time
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import (create_engine, inspect, text, select, delete, or_,
+                        Table, MetaData, Column, Integer, String, DateTime)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.schema import CreateIndex
+from datetime import datetime, timedelta
+from dog_search import install_search_index
+from db_routing import RoutingSession
+from sqlite_profile import create_sqlite_engine
 from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
 import sys
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Flask-SQLAlchemy
-db = SQLAlchemy()
+# Local SQLite replica; override to keep benchmarks and tests away from the real file
+SQLITE_URL = os.getenv('SQLITE_URL', 'sqlite:///instance/adoptease.db')
+
+# Initialize Flask-SQLAlchemy; the session can route reads to this replica (see db_routing)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -21,7 +35,16 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=False)
     type = db.Column(db.String(20), nullable=False)
     created_at = db.Column(db.DateTime, nullable=True)
-    updated_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_user_updated_at', 'updated_at'),
+        db.Index('ix_user_type_id', 'type', 'id'),
+        db.Index('ix_user_name_id', 'name', 'id'),
+        # Expression indexes backing the case-insensitive prefix search
+        db.Index('ix_user_email_lower', db.func.lower(email)),
+        db.Index('ix_user_name_lower', db.func.lower(name)),
+    )
 
 class Dog(db.Model):
     __tablename__ = 'dog'
@@ -38,14 +61,33 @@ class Dog(db.Model):
     medical_history = db.Column(db.String(1000))
     personality = db.Column(db.String(500))
     created_at = db.Column(db.DateTime, nullable=False)
-    updated_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Composite indexes backing the catalog filters and keyset pagination
+    __table_args__ = (
+        db.Index('ix_dog_breed_color_gender', 'breed', 'color', 'gender'),
+        db.Index('ix_dog_age_id', 'age', 'id'),
+        db.Index('ix_dog_height_id', 'height', 'id'),
+        db.Index('ix_dog_weight_id', 'weight', 'id'),
+        db.Index('ix_dog_created_at_id', 'created_at', 'id'),
+        db.Index('ix_dog_name_id', 'name', 'id'),
+        db.Index('ix_dog_updated_at', 'updated_at'),
+    )
+
+def ensure_indexes(engine):
+    """Create any model indexes missing from tables that already exist"""
+    # IF NOT EXISTS rather than checkfirst: reflection skips expression indexes
+    with engine.begin() as connection:
+        for table in (User.__table__, Dog.__table__):
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
 
 def initialize_sqlite_database():
     """Initialize SQLite database with proper schema"""
     print("\n=== Initializing SQLite Database ===")
     
     # Create SQLite engine
-    sqlite_engine = create_engine('sqlite:///instance/adoptease.db')
+    sqlite_engine = create_sqlite_engine(SQLITE_URL)
     SQLiteSession = sessionmaker(bind=sqlite_engine)
     sqlite_session = SQLiteSession()
     
@@ -53,11 +95,14 @@ def initialize_sqlite_database():
         # Drop existing tables if they exist
         sqlite_session.execute(text('DROP TABLE IF EXISTS user'))
         sqlite_session.execute(text('DROP TABLE IF EXISTS dog'))
+        sqlite_session.execute(text('DROP TABLE IF EXISTS sync_state'))
+        sqlite_session.execute(text('DROP TABLE IF EXISTS dog_fts'))
         sqlite_session.commit()
         
         # Create tables with proper schema
         User.__table__.create(bind=sqlite_engine)
         Dog.__table__.create(bind=sqlite_engine)
+        install_search_index(sqlite_engine)
         
         print("SQLite database initialized successfully")
         return True
@@ -68,29 +113,188 @@ def initialize_sqlite_database():
     finally:
         sqlite_session.close()
 
-def sync_databases():
-    """Synchronize data from PostgreSQL to SQLite database"""
+# Tables copied from PostgreSQL to SQLite, in sync order
+SYNC_MODELS = (User, Dog)
+
+# Rows fetched, upserted and committed together; each batch is one
+# server-side cursor fetch and one SQLite transaction
+SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', 500))
+
+# Re-read rows this far behind the high-water mark so transactions that
+# committed late with an earlier updated_at are not missed
+SYNC_LOOKBACK = timedelta(seconds=int(os.getenv('SYNC_LOOKBACK_SECONDS', 60)))
+
+# Per-table high-water marks kept in the SQLite replica between runs
+sync_state = Table(
+    'sync_state', MetaData(),
+    Column('table_name', String(50), primary_key=True),
+    Column('last_updated_at', DateTime, nullable=True),
+    Column('last_id', Integer, nullable=False),
+    Column('synced_at', DateTime, nullable=False),
+)
+
+def peak_memory_mb():
+    """Return the peak resident set size of this process in MB, if known"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def load_watermarks(sqlite_engine):
+    """Return {table_name: (last_updated_at, last_id)} from the replica"""
+    sync_state.create(bind=sqlite_engine, checkfirst=True)
+    with sqlite_engine.connect() as conn:
+        rows = conn.execute(select(sync_state)).all()
+    return {row.table_name: (row.last_updated_at, row.last_id) for row in rows}
+
+def save_watermark(sqlite_session, table_name, watermark):
+    """Record the high-water mark reached for a table"""
+    last_updated_at, last_id = watermark
+    stmt = sqlite_insert(sync_state).values(
+        table_name=table_name,
+        last_updated_at=last_updated_at,
+        last_id=last_id,
+        synced_at=datetime.utcnow()
+    )
+    sqlite_session.execute(stmt.on_conflict_do_update(
+        index_elements=['table_name'],
+        set_={
+            'last_updated_at': stmt.excluded.last_updated_at,
+            'last_id': stmt.excluded.last_id,
+            'synced_at': stmt.excluded.synced_at,
+        }
+    ))
+
+def upsert_rows(sqlite_session, model, rows):
+    """Insert or update a batch of rows in SQLite with a single statement"""
+    table = model.__table__
+    stmt = sqlite_insert(table)
+    update_columns = {c.name: stmt.excluded[c.name] for c in table.columns if not c.primary_key}
+    # Passing the rows separately runs one cached statement through executemany
+    sqlite_session.execute(stmt.on_conflict_do_update(index_elements=['id'], set_=update_columns), rows)
+
+def refresh_rows(postgres_engine, sqlite_engine, model, ids, batch_size=SYNC_BATCH_SIZE):
+    """Copy the current state of specific rows to SQLite right after they were written
+
+    Rows that no longer exist in PostgreSQL are deleted from the replica. The
+    sync watermarks are left alone, so the next incremental sync still runs.
+    """
+    table = model.__table__
+    ids = list(ids)
+    for i in range(0, len(ids), batch_size):
+        chunk = ids[i:i + batch_size]
+        with postgres_engine.connect() as source:
+            rows = [dict(row) for row in source.execute(select(table).where(model.id.in_(chunk))).mappings()]
+        with sqlite_engine.begin() as replica:
+            if rows:
+                upsert_rows(replica, model, rows)
+            gone = set(chunk) - {row['id'] for row in rows}
+            if gone:
+                replica.execute(delete(table).where(model.id.in_(gone)))
+
+def delete_missing_rows(postgres_session, sqlite_session, model, batch_size=SYNC_BATCH_SIZE):
+    """Remove rows from SQLite whose ids no longer exist in PostgreSQL
+
+    Both id lists are streamed in ascending order and merged, so only the ids
+    to delete are held in memory.
+    """
+    source_ids = postgres_session.execute(
+        select(model.id).order_by(model.id).execution_options(yield_per=batch_size)
+    ).scalars()
+    replica_ids = sqlite_session.execute(
+        select(model.id).order_by(model.id).execution_options(yield_per=batch_size)
+    ).scalars()
+
+    stale_ids = []
+    source_id = next(source_ids, None)
+    for replica_id in replica_ids:
+        while source_id is not None and source_id < replica_id:
+            source_id = next(source_ids, None)
+        if source_id != replica_id:
+            stale_ids.append(replica_id)
+
+    for i in range(0, len(stale_ids), batch_size):
+        chunk = stale_ids[i:i + batch_size]
+        sqlite_session.execute(delete(model.__table__).where(model.id.in_(chunk)))
+        sqlite_session.commit()
+    return len(stale_ids)
+
+def sync_table(postgres_session, sqlite_session, model, watermark=None, batch_size=SYNC_BATCH_SIZE):
+    """Copy changed rows of one table and return (rows synced, new watermark)
+
+    With no watermark every row is copied. Otherwise only rows updated since the
+    mark (minus SYNC_LOOKBACK) or inserted with a higher id are pulled. Rows are
+    streamed from a server-side cursor and committed to SQLite batch by batch,
+    so memory use and the SQLite write lock are bounded by the batch size.
+    """
+    table = model.__table__
+    query = select(table).order_by(model.id)
+    last_updated_at, last_id = watermark or (None, 0)
+    if watermark is not None:
+        changed = model.id > last_id
+        if last_updated_at is not None:
+            changed = or_(changed, model.updated_at > last_updated_at - SYNC_LOOKBACK)
+        query = query.where(changed)
+
+    synced = 0
+    result = postgres_session.execute(query.execution_options(yield_per=batch_size)).mappings()
+    for batch in result.partitions():
+        rows = [dict(row) for row in batch]
+        upsert_rows(sqlite_session, model, rows)
+        sqlite_session.commit()
+        synced += len(rows)
+
+        for row in rows:
+            if row['updated_at'] is not None and (last_updated_at is None or row['updated_at'] > last_updated_at):
+                last_updated_at = row['updated_at']
+            last_id = max(last_id, row['id'])
+    return synced, (last_updated_at, last_id)
+
+def sync_databases(incremental=False, batch_size=SYNC_BATCH_SIZE):
+    """Synchronize data from PostgreSQL to SQLite database
+
+    A full sync rebuilds the SQLite tables and copies every row. An incremental
+    sync reuses the replica and the per-table watermarks from the previous run,
+    pulling only changed rows and dropping rows deleted upstream. It falls back
+    to a full sync when the replica has no watermarks yet.
+
+    Each table is streamed in batches of batch_size rows, committing after every
+    batch, and its throughput and peak memory are reported when it finishes.
+    """
     print("\n=== Starting Database Synchronization ===")
     print("Note: In Render's free tier, SQLite is ephemeral and will be reset on redeployment.")
     print("This sync ensures SQLite has the latest data from PostgreSQL after each deployment.")
     
+    # Get PostgreSQL URL from environment; without it there is nothing to copy,
+    # so the local database is left untouched
+    postgres_url = os.getenv('DATABASE_URL')
+
+    if not postgres_url:
+        print("\nDATABASE_URL not found in environment variables.")
+        return
+
+    # Create SQLite engine
+    sqlite_engine = create_sqlite_engine(SQLITE_URL)
+
+    watermarks = {}
+    if incremental:
+        existing_tables = inspect(sqlite_engine).get_table_names()
+        if all(model.__tablename__ in existing_tables for model in SYNC_MODELS):
+            watermarks = load_watermarks(sqlite_engine)
+        if not all(model.__tablename__ in watermarks for model in SYNC_MODELS):
+            print("No previous sync found. Running a full sync instead.")
+            incremental = False
+            watermarks = {}
+
     # Initialize SQLite database first
-    if not initialize_sqlite_database():
+    if not incremental and not initialize_sqlite_database():
         print("Failed to initialize SQLite database. Aborting sync.")
         return
     
-    # Create SQLite engine
-    sqlite_engine = create_engine('sqlite:///instance/adoptease.db')
     SQLiteSession = sessionmaker(bind=sqlite_engine)
     sqlite_session = SQLiteSession()
     
-    # Get PostgreSQL URL from environment
-    postgres_url = os.getenv('DATABASE_URL')
-    
-    if not postgres_url:
-        print("\nDATABASE_URL not found in environment variables.")
-        return
-    
     # Convert postgres:// to postgresql:// if needed
     if postgres_url.startswith('postgres://'):
         postgres_url = postgres_url.replace('postgres://', 'postgresql://', 1)
@@ -100,98 +304,29 @@ def sync_databases():
     postgres_session = PostgreSQLSession()
     
     try:
-        # Get counts from both databases
-        sqlite_users = sqlite_session.query(User).count()
-        sqlite_dogs = sqlite_session.query(Dog).count()
-        postgres_users = postgres_session.query(User).count()
-        postgres_dogs = postgres_session.query(Dog).count()
-        
-        print(f"\nInitial counts:")
-        print(f"SQLite - Users: {sqlite_users}, Dogs: {sqlite_dogs}")
-        print(f"PostgreSQL - Users: {postgres_users}, Dogs: {postgres_dogs}")
-        
-        # Track changes
-        users_added = 0
-        users_updated = 0
-        dogs_added = 0
-        dogs_updated = 0
-        
-        # Sync users from PostgreSQL to SQLite
-        print("\n=== Syncing users from PostgreSQL to SQLite ===")
-        for postgres_user in postgres_session.query(User).all():
-            try:
-                existing_user = sqlite_session.query(User).filter_by(id=postgres_user.id).first()
-                current_time = datetime.utcnow()
-                
-                if existing_user:
-                    # Update existing user
-                    for key, value in postgres_user.__dict__.items():
-                        if not key.startswith('_'):
-                            setattr(existing_user, key, value)
-                    existing_user.updated_at = current_time
-                    users_updated += 1
-                else:
-                    # Add new user
-                    new_user = User(
-                        id=postgres_user.id,
-                        name=postgres_user.name,
-                        email=postgres_user.email,
-                        password=postgres_user.password,
-                        type=postgres_user.type,
-                        created_at=postgres_user.created_at,
-                        updated_at=current_time
-                    )
-                    sqlite_session.add(new_user)
-                    users_added += 1
-            except Exception as e:
-                print(f"Error syncing user {postgres_user.id}: {str(e)}")
-                continue
-        
-        # Sync dogs from PostgreSQL to SQLite
-        print("\n=== Syncing dogs from PostgreSQL to SQLite ===")
-        for postgres_dog in postgres_session.query(Dog).all():
-            try:
-                existing_dog = sqlite_session.query(Dog).filter_by(id=postgres_dog.id).first()
-                current_time = datetime.utcnow()
-                
-                if existing_dog:
-                    # Update existing dog
-                    for key, value in postgres_dog.__dict__.items():
-                        if not key.startswith('_'):
-                            setattr(existing_dog, key, value)
-                    existing_dog.updated_at = current_time
-                    dogs_updated += 1
-                else:
-                    # Add new dog
-                    new_dog = Dog(
-                        id=postgres_dog.id,
-                        name=postgres_dog.name,
-                        breed=postgres_dog.breed,
-                        age=postgres_dog.age,
-                        color=postgres_dog.color,
-                        height=postgres_dog.height,
-                        weight=postgres_dog.weight,
-                        gender=postgres_dog.gender,
-                        vaccines=postgres_dog.vaccines,
-                        diseases=postgres_dog.diseases,
-                        medical_history=postgres_dog.medical_history,
-                        personality=postgres_dog.personality,
-                        created_at=postgres_dog.created_at,
-                        updated_at=current_time
-                    )
-                    sqlite_session.add(new_dog)
-                    dogs_added += 1
-            except Exception as e:
-                print(f"Error syncing dog {postgres_dog.id}: {str(e)}")
-                continue
-        
-        # Commit all changes
-        sqlite_session.commit()
-        
-        # Print sync summary
-        print("\n=== Sync Summary ===")
-        print(f"Users: {users_added} added, {users_updated} updated")
-        print(f"Dogs: {dogs_added} added, {dogs_updated} updated")
+        print(f"\nMode: {'incremental' if incremental else 'full'}, batch size: {batch_size}")
+        sync_state.create(bind=sqlite_engine, checkfirst=True)
+
+        for model in SYNC_MODELS:
+            name = model.__tablename__
+            print(f"\n=== Syncing {name} table from PostgreSQL to SQLite ===")
+            start_time = time.perf_counter()
+
+            deleted = 0
+            if incremental:
+                deleted = delete_missing_rows(postgres_session, sqlite_session, model, batch_size)
+
+            synced, watermark = sync_table(postgres_session, sqlite_session, model,
+                                           watermarks.get(name), batch_size)
+            save_watermark(sqlite_session, name, watermark)
+            sqlite_session.commit()
+
+            elapsed = time.perf_counter() - start_time
+            rate = synced / elapsed if elapsed > 0 else 0
+            print(f"{name}: {synced} upserted, {deleted} deleted in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+            peak = peak_memory_mb()
+            if peak is not None:
+                print(f"{name}: peak RSS {peak:.1f} MB")
         
         # Verify final counts
         final_sqlite_users = sqlite_session.query(User).count()
@@ -199,7 +334,6 @@ def sync_databases():
         
         print(f"\nFinal counts:")
         print(f"SQLite - Users: {final_sqlite_users}, Dogs: {final_sqlite_dogs}")
-        print(f"PostgreSQL - Users: {postgres_users}, Dogs: {postgres_dogs}")
         
     except Exception as e:
         print(f"Error during synchronization: {str(e)}")
@@ -210,6 +344,18 @@ def sync_databases():
     
     print("\n=== Database Synchronization Complete ===")
 
+def replica_synced():
+    """True when there is nothing to sync or the replica holds a completed sync of every table"""
+    if not os.getenv('DATABASE_URL'):
+        return True
+    sqlite_engine = create_sqlite_engine(SQLITE_URL)
+    try:
+        if 'sync_state' not in inspect(sqlite_engine).get_table_names():
+            return False
+        return all(model.__tablename__ in load_watermarks(sqlite_engine) for model in SYNC_MODELS)
+    finally:
+        sqlite_engine.dispose()
+
 def run_continuous_sync(interval_seconds=300):  # Default 5 minutes
     """Run sync continuously at specified intervals"""
     print(f"Starting continuous sync with {interval_seconds} second interval...")
@@ -219,7 +365,7 @@ def run_continuous_sync(interval_seconds=300):  # Default 5 minutes
     
     while True:
         try:
-            sync_databases()
+            sync_databases(incremental=True)
             print(f"\nNext sync in {interval_seconds} seconds...")
             time.sleep(interval_seconds)
         except KeyboardInterrupt:
@@ -234,5 +380,7 @@ if __name__ == "__main__":
     # Check if continuous sync is requested
     if len(sys.argv) > 1 and sys.argv[1] == "--continuous":
         run_continuous_sync()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--incremental":
+        sync_databases(incremental=True)
     else:
         sync_databases() 
\ No newline at end of file
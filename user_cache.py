@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Snapshot of the fields protected handlers read from the authenticated user
+AuthUser = namedtuple('AuthUser', ['id', 'email', 'name', 'type'])
+
+
+class UserCache:
+    """Bounded LRU cache with a TTL for users resolved by token_required
+
+    Entries are keyed by email, which is what the JWT carries. Anything that
+    deletes a user or changes their role must call invalidate() so the next
+    request reloads the row.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email):
+        """Return the cached AuthUser for an email, or None when missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(email)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[email]
+            self.misses += 1
+            return None
+
+    def put(self, user):
+        """Cache a snapshot of a User row and return it"""
+        auth_user = AuthUser(user.id, user.email, user.name, user.type)
+        with self._lock:
+            self._entries[user.email] = (time.monotonic() + self.ttl, auth_user)
+            self._entries.move_to_end(user.email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return auth_user
+
+    def invalidate(self, email):
+        """Drop the entry for an email so the next lookup hits the database"""
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,125 @@
+from flask import json
+from sqlalchemy import func, or_, select, tuple_
+from catalog import encode_cursor, decode_cursor
+from sync_databases import User
+
+# Ids are assigned in registration order and, unlike created_at, are never NULL,
+# so "created" sorts by id and keyset pagination needs no NULL handling
+USER_SORT_COLUMNS = {
+    'id': User.id,
+    'name': User.name,
+}
+USER_SORT_ALIASES = {'created': 'id'}
+
+USER_TYPES = ('customer', 'expert', 'admin')
+
+# Query parameters that switch the user listing into paginated mode
+USER_LISTING_PARAMS = ('q', 'type', 'sort', 'limit', 'cursor')
+
+# Everything the admin page shows; the password hash is never read
+USER_COLUMNS = (User.id, User.email, User.name, User.type, User.created_at)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def is_user_listing_query(args):
+    """Check whether the request asks for a searched/paginated user listing"""
+    return any(name in args for name in USER_LISTING_PARAMS)
+
+
+def parse_user_params(args):
+    """Validate user listing query parameters, raising ValueError on bad input"""
+    sort = args.get('sort', 'id_asc')
+    sort_key, _, direction = sort.rpartition('_')
+    sort_key = USER_SORT_ALIASES.get(sort_key, sort_key)
+    if sort_key not in USER_SORT_COLUMNS or direction not in ('asc', 'desc'):
+        raise ValueError(f"Unsupported sort: {sort}")
+
+    user_type = args.get('type') or None
+    if user_type and user_type not in USER_TYPES:
+        raise ValueError(f"type must be one of: {', '.join(USER_TYPES)}")
+
+    try:
+        limit = int(args.get('limit') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit must be a number")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+
+    params = {
+        "q": (args.get('q') or '').strip().lower() or None,
+        "type": user_type,
+        "sort_key": sort_key,
+        "descending": direction == 'desc',
+        "limit": min(limit, MAX_PAGE_SIZE),
+        "after": None,
+    }
+    if args.get('cursor'):
+        params["after"] = decode_cursor(args['cursor'], sort_key)
+    return params
+
+
+def prefix_match(column, prefix):
+    """Case-insensitive prefix match that can use an index on lower(column)
+
+    The range bounds let the planner scan the expression index; the LIKE
+    re-checks the range under collations that do not order by code point.
+    """
+    lowered = func.lower(column)
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return (lowered >= prefix) & (lowered < upper_bound) & lowered.like(escaped + '%', escape='\\')
+
+
+def build_user_query(params):
+    """Select one page (plus one look-ahead row) of users matching the parameters"""
+    query = select(*USER_COLUMNS)
+    if params["type"]:
+        query = query.where(User.type == params["type"])
+    if params["q"]:
+        query = query.where(or_(prefix_match(User.email, params["q"]), prefix_match(User.name, params["q"])))
+
+    column = USER_SORT_COLUMNS[params["sort_key"]]
+    if params["after"] is not None:
+        value, user_id = params["after"]
+        if column is User.id:
+            query = query.where(User.id < user_id if params["descending"] else User.id > user_id)
+        elif params["descending"]:
+            query = query.where(tuple_(column, User.id) < tuple_(value, user_id))
+        else:
+            query = query.where(tuple_(column, User.id) > tuple_(value, user_id))
+
+    if params["descending"]:
+        query = query.order_by(column.desc(), User.id.desc())
+    else:
+        query = query.order_by(column.asc(), User.id.asc())
+    return query.limit(params["limit"] + 1)
+
+
+def serialize_user(row):
+    return {
+        "id": row.id,
+        "email": row.email,
+        "name": row.name,
+        "type": row.type,
+        "created_at": row.created_at,
+    }
+
+
+def stream_users(rows, params=None):
+    """Encode {"users": [...]} one row at a time as rows come off the cursor
+
+    With paging parameters the look-ahead row is dropped and a next_cursor
+    (or null on the last page) is appended after the list.
+    """
+    yield '{"users":['
+    last = None
+    for count, row in enumerate(rows):
+        if params is not None and count == params["limit"]:
+            cursor = encode_cursor(params["sort_key"], last, USER_SORT_COLUMNS)
+            yield '],"next_cursor":' + json.dumps(cursor) + '}'
+            return
+        yield (',' if count else '') + json.dumps(serialize_user(row))
+        last = row
+    yield '],"next_cursor":null}' if params is not None else ']}'